@@ -0,0 +1,279 @@
+import asyncio
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Date, cast, extract, func, select
+
+from backend.core.config import settings
+from backend.database import LazyAsyncSession
+from backend.models_db import VisitorDataDb, VisitorDataVersionDb
+
+# Supported calendar buckets for the aggregate endpoints, mapped to PostgreSQL date_trunc fields.
+AGGREGATE_PERIODS = {
+    'daily': 'day',
+    'weekly': 'week',
+    'monthly': 'month',
+}
+
+DEFAULT_PAGE_SIZE = 366
+MAX_PAGE_SIZE = 5000
+DEFAULT_TEMP_BUCKET_WIDTH = 2.0
+
+# Result cache keyed by query parameters (the site id is always the second element). Every entry
+# remembers the fingerprint of its site's data it was computed against, so results stay valid
+# until rows of that site are ingested into (or change in) visitor_data.
+_result_cache: Dict[Tuple[Any, ...], Tuple[Tuple[Any, ...], Any]] = {}
+_cache_fingerprints: Dict[Optional[str], Tuple[Any, ...]] = {}
+MAX_CACHE_ENTRIES = 256
+
+# Columns exposed by the raw-row listing (everything except the surrogate id).
+RECORD_COLUMNS = [column for column in VisitorDataDb.__table__.columns if column.name != 'id']
+
+
+def _summary_columns() -> List[Any]:
+    return [
+        func.count(VisitorDataDb.id).label('days'),
+        func.sum(VisitorDataDb.visitor_count).label('total_visitors'),
+        func.avg(VisitorDataDb.visitor_count).label('avg_visitors'),
+        func.min(VisitorDataDb.visitor_count).label('min_visitors'),
+        func.max(VisitorDataDb.visitor_count).label('max_visitors'),
+        func.avg(VisitorDataDb.temp).label('avg_temp'),
+    ]
+
+
+def _apply_filters(stmt, start_date: Optional[date], end_date: Optional[date], site_id: Optional[str]):
+    if site_id is not None:
+        stmt = stmt.where(VisitorDataDb.site_id == site_id)
+    if start_date is not None:
+        stmt = stmt.where(VisitorDataDb.date >= start_date)
+    if end_date is not None:
+        stmt = stmt.where(VisitorDataDb.date <= end_date)
+    return stmt
+
+
+def _to_float(value: Any) -> Optional[float]:
+    # PostgreSQL returns NUMERIC for AVG over integers; normalise to plain floats for JSON.
+    return None if value is None else float(value)
+
+
+def _summary_dict(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'days': int(row['days']),
+        'total_visitors': int(row['total_visitors'] or 0),
+        'avg_visitors': _to_float(row['avg_visitors']) or 0.0,
+        'min_visitors': int(row['min_visitors'] or 0),
+        'max_visitors': int(row['max_visitors'] or 0),
+        'avg_temp': _to_float(row['avg_temp']),
+    }
+
+
+async def _fetch(db: LazyAsyncSession, stmt) -> List[Dict[str, Any]]:
+    """Runs a select against the configured storage backend and returns rows as dicts."""
+    if settings.use_columnar_store:
+        from backend import columnar_store
+        # DuckDB calls are blocking; keep them off the event loop. The lazy session is never touched.
+        return await asyncio.to_thread(columnar_store.fetch_mappings, stmt)
+    return [dict(row) for row in (await db.execute(stmt)).mappings().all()]
+
+
+def build_period_aggregate_query(
+    period: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    site_id: Optional[str] = None
+):
+    """Builds a GROUP BY query bucketing visitor_data by day, ISO week or month."""
+    if period not in AGGREGATE_PERIODS:
+        raise ValueError(f"Unsupported period '{period}'. Expected one of: {', '.join(AGGREGATE_PERIODS)}.")
+
+    if period == 'daily':
+        bucket = VisitorDataDb.date
+    else:
+        bucket = cast(func.date_trunc(AGGREGATE_PERIODS[period], VisitorDataDb.date), Date)
+    bucket = bucket.label('period_start')
+
+    stmt = select(bucket, *_summary_columns())
+    stmt = _apply_filters(stmt, start_date, end_date, site_id)
+    return stmt.group_by(bucket).order_by(bucket)
+
+
+def build_weekday_aggregate_query(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    site_id: Optional[str] = None
+):
+    """Builds a GROUP BY query over the weekday (Monday=0, matching features.create_date_features)."""
+    weekday = (extract('isodow', VisitorDataDb.date) - 1).label('day_of_week')
+
+    stmt = select(weekday, *_summary_columns())
+    stmt = _apply_filters(stmt, start_date, end_date, site_id)
+    return stmt.group_by(weekday).order_by(weekday)
+
+
+def build_temperature_bucket_query(
+    bucket_width: float = DEFAULT_TEMP_BUCKET_WIDTH,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    site_id: Optional[str] = None
+):
+    """Builds a GROUP BY query bucketing days by observed temperature."""
+    if bucket_width <= 0:
+        raise ValueError("bucket_width must be positive.")
+
+    bucket = (func.floor(VisitorDataDb.temp / bucket_width) * bucket_width).label('temp_from')
+
+    stmt = select(bucket, *_summary_columns()).where(VisitorDataDb.temp.isnot(None))
+    stmt = _apply_filters(stmt, start_date, end_date, site_id)
+    return stmt.group_by(bucket).order_by(bucket)
+
+
+def build_visitor_data_page_query(
+    after: Optional[date] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    site_id: Optional[str] = None
+):
+    """
+    Builds a keyset-paginated listing ordered by date. One extra row is fetched so the caller
+    can tell whether another page exists without a COUNT query.
+    """
+    stmt = select(*RECORD_COLUMNS)
+    stmt = _apply_filters(stmt, start_date, end_date, site_id)
+    if after is not None:
+        stmt = stmt.where(VisitorDataDb.date > after)
+    return stmt.order_by(VisitorDataDb.date).limit(limit + 1)
+
+
+def build_fingerprint_query(site_id: Optional[str] = None):
+    """
+    Cheap per-site fingerprint: row count, max(id) and max(date) resolve from the site_id
+    indexes, and the data version row is bumped by every ingest, which also covers upserts
+    that correct existing rows in place.
+    """
+    version = select(func.coalesce(func.sum(VisitorDataVersionDb.version), 0))
+    if site_id is not None:
+        version = version.where(VisitorDataVersionDb.site_id == site_id)
+    stmt = select(
+        func.count(VisitorDataDb.id).label('row_count'),
+        func.max(VisitorDataDb.id).label('max_id'),
+        func.max(VisitorDataDb.date).label('max_date'),
+        version.scalar_subquery().label('data_version'),
+    )
+    return _apply_filters(stmt, None, None, site_id)
+
+
+def invalidate_analytics_cache(site_ids: Optional[Iterable[Optional[str]]] = None) -> None:
+    """Drops cached analytics results for `site_ids` (default: all sites). Called after ingestion."""
+    if site_ids is None:
+        _result_cache.clear()
+        _cache_fingerprints.clear()
+        return
+    for site_id in set(site_ids):
+        _drop_site(site_id)
+
+
+def _drop_site(site_id: Optional[str]) -> None:
+    _cache_fingerprints.pop(site_id, None)
+    for key in [key for key in _result_cache if key[1] == site_id]:
+        del _result_cache[key]
+
+
+async def _cached(db: LazyAsyncSession, key: Tuple[Any, ...], compute: Callable[[], Awaitable[Any]]) -> Any:
+    site_id = key[1]
+    fingerprint = tuple((await _fetch(db, build_fingerprint_query(site_id)))[0].values())
+    if fingerprint != _cache_fingerprints.get(site_id):
+        # The site's data changed since its entries were cached; they are all stale.
+        _drop_site(site_id)
+        _cache_fingerprints[site_id] = fingerprint
+
+    entry = _result_cache.get(key)
+    if entry is not None and entry[0] == fingerprint:
+        return entry[1]
+
+    result = await compute()
+    if len(_result_cache) >= MAX_CACHE_ENTRIES:
+        _result_cache.pop(next(iter(_result_cache)))
+    _result_cache[key] = (fingerprint, result)
+    return result
+
+
+async def get_period_aggregates(
+    db: LazyAsyncSession,
+    period: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    site_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    stmt = build_period_aggregate_query(period, start_date, end_date, site_id)
+
+    async def compute():
+        return [
+            {'period_start': row['period_start'], **_summary_dict(row)}
+            for row in await _fetch(db, stmt)
+        ]
+
+    return await _cached(db, ('period', site_id, period, start_date, end_date), compute)
+
+
+async def get_weekday_aggregates(
+    db: LazyAsyncSession,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    site_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    stmt = build_weekday_aggregate_query(start_date, end_date, site_id)
+
+    async def compute():
+        return [
+            {'day_of_week': int(row['day_of_week']), **_summary_dict(row)}
+            for row in await _fetch(db, stmt)
+        ]
+
+    return await _cached(db, ('weekday', site_id, start_date, end_date), compute)
+
+
+async def get_temperature_buckets(
+    db: LazyAsyncSession,
+    bucket_width: float = DEFAULT_TEMP_BUCKET_WIDTH,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    site_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    stmt = build_temperature_bucket_query(bucket_width, start_date, end_date, site_id)
+
+    async def compute():
+        buckets = []
+        for row in await _fetch(db, stmt):
+            temp_from = float(row['temp_from'])
+            buckets.append({
+                'temp_from': temp_from,
+                'temp_to': temp_from + bucket_width,
+                **_summary_dict(row)
+            })
+        return buckets
+
+    return await _cached(db, ('temperature', site_id, bucket_width, start_date, end_date), compute)
+
+
+async def get_visitor_data_page(
+    db: LazyAsyncSession,
+    after: Optional[date] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    site_id: Optional[str] = None
+) -> Dict[str, Any]:
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    stmt = build_visitor_data_page_query(after, limit, start_date, end_date, site_id)
+
+    async def compute():
+        rows = await _fetch(db, stmt)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            'items': rows,
+            'next_cursor': rows[-1]['date'] if has_more and rows else None,
+        }
+
+    return await _cached(db, ('page', site_id, after, limit, start_date, end_date), compute)
@@ -0,0 +1,312 @@
+import asyncio
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, insert, select
+from threadpoolctl import threadpool_limits
+from sqlalchemy.orm import Session
+
+from backend import services, features, ml_trainer, model_engines
+from backend.core.config import settings
+from backend.database import SessionLocal, LazyAsyncSession
+from backend.models_db import BacktestCutoffDb, BacktestResultDb
+
+DEFAULT_HORIZON_DAYS = 7     # Days predicted after each cutoff (matches the default forecast window)
+DEFAULT_STEP_DAYS = 7        # Distance between consecutive cutoffs
+MIN_TRAINING_ROWS = 30       # Cutoffs with less history than this are not evaluated
+
+# Feature matrix shared by all cutoffs of a run. Populated once per worker process by
+# _init_worker (inherited without pickling when the pool forks) and sliced per cutoff.
+_shared: Dict[str, np.ndarray] = {}
+
+
+def _init_worker(dates: np.ndarray, X: np.ndarray, y: np.ndarray) -> None:
+    _shared['dates'] = dates
+    _shared['X'] = X
+    _shared['y'] = y
+    # One thread per worker for OpenMP/BLAS too; n_jobs=1 in build_model only reaches the forest.
+    threadpool_limits(limits=1)
+
+
+def _evaluate_cutoff(cutoff: np.datetime64, horizon_days: int):
+    """Trains on all rows before `cutoff` and predicts the following `horizon_days` days."""
+    dates, X, y = _shared['dates'], _shared['X'], _shared['y']
+
+    train_end = int(np.searchsorted(dates, cutoff, side='left'))
+    eval_end = int(np.searchsorted(dates, cutoff + np.timedelta64(horizon_days, 'D'), side='left'))
+
+    # Each worker is a single process already; nested tree-level parallelism would oversubscribe.
+    model = ml_trainer.build_model(n_jobs=1)
+    model.fit(X[:train_end], y[:train_end])
+    predictions = np.maximum(0, model.predict(X[train_end:eval_end])).astype(int)
+
+    return cutoff, dates[train_end:eval_end], predictions, y[train_end:eval_end].astype(int)
+
+
+def model_config_hash(horizon_days: int) -> str:
+    """Hash of everything besides the data that influences backtest output."""
+    params = {k: v for k, v in model_engines.engine_params(settings.MODEL_ENGINE).items() if k != 'n_jobs'}
+    payload = json.dumps(
+        {
+            'engine': settings.MODEL_ENGINE,
+            'params': params,
+            'features': features.MODEL_FEATURES,
+            'horizon_days': horizon_days
+        },
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _data_hash(dates: np.ndarray, X: np.ndarray, y: np.ndarray, end: int) -> str:
+    digest = hashlib.sha256()
+    digest.update(dates[:end].tobytes())
+    digest.update(X[:end].tobytes())
+    digest.update(y[:end].tobytes())
+    return digest.hexdigest()
+
+
+def build_feature_matrix(historical_data_df: pd.DataFrame):
+    """Returns (dates, X, y) sorted by date, with X in MODEL_FEATURES column order."""
+    prepared_df = ml_trainer.prepare_training_frame(historical_data_df)
+    if prepared_df.empty:
+        return np.array([], dtype='datetime64[D]'), np.empty((0, len(features.MODEL_FEATURES))), np.empty(0)
+
+    dates = pd.to_datetime(historical_data_df.loc[prepared_df.index, 'date']).to_numpy().astype('datetime64[D]')
+    order = np.argsort(dates, kind='stable')
+
+    X = np.ascontiguousarray(prepared_df[features.MODEL_FEATURES].to_numpy(dtype=np.float64)[order])
+    y = np.ascontiguousarray(prepared_df[ml_trainer.TARGET_COLUMN].to_numpy(dtype=np.float64)[order])
+    return dates[order], X, y
+
+
+def generate_cutoffs(dates: np.ndarray, step_days: int) -> List[np.datetime64]:
+    """Cutoffs every `step_days` from the first date with MIN_TRAINING_ROWS of history to the last date."""
+    if len(dates) <= MIN_TRAINING_ROWS:
+        return []
+    first = dates[MIN_TRAINING_ROWS]
+    last = dates[-1]
+    return list(np.arange(first, last + np.timedelta64(1, 'D'), np.timedelta64(step_days, 'D')))
+
+
+def _store_cutoff(
+    db: Session,
+    site_id: str,
+    cutoff: date,
+    horizon_days: int,
+    config_hash: str,
+    data_hash: str,
+    training_rows: int,
+    result_dates: np.ndarray,
+    predictions: np.ndarray,
+    actuals: np.ndarray
+) -> None:
+    errors = predictions - actuals
+    abs_errors = np.abs(errors)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct_errors = np.where(actuals > 0, abs_errors / np.where(actuals > 0, actuals, 1), np.nan)
+
+    results = [
+        {
+            'site_id': site_id,
+            'cutoff_date': cutoff,
+            'date': day,
+            'days_ahead': (day - cutoff).days + 1,
+            'predicted_visitors': int(pred),
+            'actual_visitors': int(actual),
+            'error': int(err),
+            'abs_error': int(abs_err),
+            'pct_error': None if np.isnan(pct) else float(pct),
+        }
+        for day, pred, actual, err, abs_err, pct in zip(
+            result_dates.astype(object), predictions, actuals, errors, abs_errors, pct_errors
+        )
+    ]
+    summary = {
+        'site_id': site_id,
+        'cutoff_date': cutoff,
+        'horizon_days': horizon_days,
+        'config_hash': config_hash,
+        'data_hash': data_hash,
+        'training_rows': training_rows,
+        'evaluated_days': len(predictions),
+        'mae': float(abs_errors.mean()) if len(abs_errors) else None,
+        'rmse': float(np.sqrt((errors.astype(float) ** 2).mean())) if len(errors) else None,
+        'mape': float(np.nanmean(pct_errors)) if np.any(~np.isnan(pct_errors)) else None,
+        'created_at': datetime.utcnow(),
+    }
+
+    # Replace any previous output for this cutoff. Plain Core statements so the same code
+    # path works against PostgreSQL and the columnar store.
+    statements = [
+        delete(BacktestResultDb).where(
+            BacktestResultDb.site_id == site_id, BacktestResultDb.cutoff_date == cutoff
+        ),
+        delete(BacktestCutoffDb).where(
+            BacktestCutoffDb.site_id == site_id, BacktestCutoffDb.cutoff_date == cutoff
+        ),
+        insert(BacktestCutoffDb).values(**summary),
+    ]
+    if results:
+        statements.append(insert(BacktestResultDb).values(results))
+    _execute_statements(db, statements)
+
+
+def _execute_statements(db: Session, statements: List[Any]) -> None:
+    if settings.use_columnar_store:
+        from backend import columnar_store
+        columnar_store.execute_statements(statements)
+    else:
+        for stmt in statements:
+            db.execute(stmt)
+        db.commit()
+
+
+def _delete_cutoffs(db: Session, site_id: str, cutoffs: List[date]) -> None:
+    """Removes stored summaries and results for the given cutoffs of a site."""
+    _execute_statements(db, [
+        delete(BacktestResultDb).where(
+            BacktestResultDb.site_id == site_id, BacktestResultDb.cutoff_date.in_(cutoffs)
+        ),
+        delete(BacktestCutoffDb).where(
+            BacktestCutoffDb.site_id == site_id, BacktestCutoffDb.cutoff_date.in_(cutoffs)
+        ),
+    ])
+
+
+def _load_previous_hashes(db: Session, site_id: str) -> Dict[date, Tuple[str, str]]:
+    stmt = select(
+        BacktestCutoffDb.cutoff_date, BacktestCutoffDb.config_hash, BacktestCutoffDb.data_hash
+    ).where(BacktestCutoffDb.site_id == site_id)
+    if settings.use_columnar_store:
+        from backend import columnar_store
+        rows = columnar_store.fetch_mappings(stmt)
+    else:
+        rows = db.execute(stmt).mappings().all()
+    return {row['cutoff_date']: (row['config_hash'], row['data_hash']) for row in rows}
+
+
+def run_backtest(
+    site_id: Optional[str] = None,
+    step_days: int = DEFAULT_STEP_DAYS,
+    horizon_days: int = DEFAULT_HORIZON_DAYS,
+    max_workers: Optional[int] = None,
+    force: bool = False
+) -> Dict[str, Any]:
+    """
+    Simulates retraining at every cutoff over a site's stored history (default: DEFAULT_SITE_ID)
+    and records predicted vs. actual visitors for the days following each cutoff.
+
+    Cutoffs whose training/evaluation data and model configuration are unchanged since the
+    previous run are skipped unless `force` is set.
+    """
+    site_id = site_id or settings.DEFAULT_SITE_ID
+    print(f"Starting backtest for site '{site_id}'...")
+    max_workers = max_workers or settings.BACKTEST_MAX_WORKERS
+
+    db = SessionLocal()
+    try:
+        # 1. Load the full history once and build the shared feature matrix
+        historical_data_df = services.get_historical_visitor_data(
+            db=db, limit=None, columns=ml_trainer.TRAINING_COLUMNS, site_id=site_id
+        )
+        if historical_data_df.empty:
+            print("No historical data loaded. Aborting backtest.")
+            return {'cutoffs_total': 0, 'cutoffs_run': 0, 'cutoffs_skipped': 0}
+
+        dates, X, y = build_feature_matrix(historical_data_df)
+        cutoffs = generate_cutoffs(dates, step_days)
+        print(f"Loaded {len(dates)} records, {len(cutoffs)} cutoffs.")
+
+        # 2. Work out which cutoffs actually need recomputing
+        config_hash = model_config_hash(horizon_days)
+        previous = _load_previous_hashes(db, site_id)
+
+        # Cutoffs from earlier runs with a different step aren't part of this run; drop them so
+        # the stored results always describe exactly the current cutoff set.
+        stale = sorted(set(previous) - {cutoff.astype(object) for cutoff in cutoffs})
+        if stale:
+            print(f"Removing {len(stale)} cutoffs from earlier runs that are not in the current set.")
+            _delete_cutoffs(db, site_id, stale)
+
+        pending = {}
+        for cutoff in cutoffs:
+            eval_end = int(np.searchsorted(dates, cutoff + np.timedelta64(horizon_days, 'D'), side='left'))
+            data_hash = _data_hash(dates, X, y, eval_end)
+            if not force and previous.get(cutoff.astype(object)) == (config_hash, data_hash):
+                continue
+            pending[cutoff] = data_hash
+
+        print(f"{len(pending)} cutoffs to evaluate, {len(cutoffs) - len(pending)} unchanged.")
+
+        # 3. Evaluate pending cutoffs in parallel, storing each one as it completes
+        if pending:
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_init_worker,
+                initargs=(dates, X, y)
+            ) as executor:
+                futures = [executor.submit(_evaluate_cutoff, cutoff, horizon_days) for cutoff in pending]
+                for future in as_completed(futures):
+                    cutoff, result_dates, predictions, actuals = future.result()
+                    _store_cutoff(
+                        db,
+                        site_id=site_id,
+                        cutoff=cutoff.astype(object),
+                        horizon_days=horizon_days,
+                        config_hash=config_hash,
+                        data_hash=pending[cutoff],
+                        training_rows=int(np.searchsorted(dates, cutoff, side='left')),
+                        result_dates=result_dates,
+                        predictions=predictions,
+                        actuals=actuals
+                    )
+
+        print("Backtest complete.")
+        return {
+            'cutoffs_total': len(cutoffs),
+            'cutoffs_run': len(pending),
+            'cutoffs_skipped': len(cutoffs) - len(pending),
+        }
+    finally:
+        db.close()
+
+
+async def get_backtest_results(
+    db: LazyAsyncSession,
+    site_id: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    days_ahead: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    stmt = select(*[c for c in BacktestResultDb.__table__.columns if c.name != 'id']).where(
+        BacktestResultDb.site_id == site_id
+    )
+    if start_date is not None:
+        stmt = stmt.where(BacktestResultDb.date >= start_date)
+    if end_date is not None:
+        stmt = stmt.where(BacktestResultDb.date <= end_date)
+    if days_ahead is not None:
+        stmt = stmt.where(BacktestResultDb.days_ahead == days_ahead)
+    stmt = stmt.order_by(BacktestResultDb.date, BacktestResultDb.cutoff_date)
+
+    if settings.use_columnar_store:
+        from backend import columnar_store
+        return await asyncio.to_thread(columnar_store.fetch_mappings, stmt)
+    return [dict(row) for row in (await db.execute(stmt)).mappings().all()]
+
+
+if __name__ == "__main__":
+    # Adjust sys.path if run directly
+    backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if backend_root not in sys.path:
+        sys.path.insert(0, backend_root)
+
+    print(run_backtest())
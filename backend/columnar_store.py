@@ -0,0 +1,251 @@
+# Embedded columnar storage (DuckDB), used when STORAGE_BACKEND=duckdb.
+# Holds the same tables as the ORM models in one local file so single-node deployments and CI
+# can run without PostgreSQL. Reads return DataFrames straight from DuckDB's vectorized scans.
+# DuckDB allows a single writing process: run uvicorn with one worker in this mode.
+import os
+import sys
+import threading
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import duckdb
+import pandas as pd
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, String, Table, UniqueConstraint
+from sqlalchemy.dialects import postgresql
+
+from backend.core.config import settings
+from backend.database import Base
+
+_connection: Optional[duckdb.DuckDBPyConnection] = None
+_connection_lock = threading.Lock()
+
+
+def get_connection() -> duckdb.DuckDBPyConnection:
+    """Opens the DuckDB file on first use. Callers should work on their own `.cursor()`."""
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            os.makedirs(os.path.dirname(settings.COLUMNAR_DB_PATH) or ".", exist_ok=True)
+            _connection = duckdb.connect(settings.COLUMNAR_DB_PATH)
+            print(f"Opened columnar store at: {settings.COLUMNAR_DB_PATH}")
+        return _connection
+
+
+def _column_type(column) -> str:
+    # Explicit mapping: e.g. PostgreSQL's FLOAT means double precision, DuckDB's FLOAT is 4 bytes.
+    if isinstance(column.type, Boolean):
+        return "BOOLEAN"
+    if isinstance(column.type, Integer):
+        return "INTEGER"
+    if isinstance(column.type, Float):
+        return "DOUBLE"
+    if isinstance(column.type, DateTime):
+        return "TIMESTAMP"
+    if isinstance(column.type, Date):
+        return "DATE"
+    if isinstance(column.type, String):
+        return "VARCHAR"
+    raise TypeError(f"Unsupported column type for columnar store: {column.type!r}")
+
+
+def _create_table_sql(table: Table) -> List[str]:
+    """DuckDB DDL mirroring an ORM table, with a sequence standing in for SERIAL ids."""
+    statements = []
+    column_defs = []
+    for column in table.columns:
+        definition = f"{column.name} {_column_type(column)}"
+        if column.primary_key:
+            sequence = f"{table.name}_{column.name}_seq"
+            statements.append(f"CREATE SEQUENCE IF NOT EXISTS {sequence}")
+            definition += f" PRIMARY KEY DEFAULT nextval('{sequence}')"
+        else:
+            if not column.nullable:
+                definition += " NOT NULL"
+            if column.unique:
+                definition += " UNIQUE"
+            if column.server_default is not None:
+                default = str(column.server_default.arg).replace("'", "''")
+                definition += f" DEFAULT '{default}'"
+        column_defs.append(definition)
+
+    for constraint in table.constraints:
+        if isinstance(constraint, UniqueConstraint) and len(constraint.columns) > 1:
+            column_defs.append(f"UNIQUE ({', '.join(c.name for c in constraint.columns)})")
+
+    statements.append(f"CREATE TABLE IF NOT EXISTS {table.name} ({', '.join(column_defs)})")
+    return statements
+
+
+def init_schema() -> None:
+    """Creates every ORM table in the DuckDB file if it doesn't exist yet."""
+    from backend import models_db  # Ensure all models are registered with Base
+
+    cursor = get_connection().cursor()
+    try:
+        for table in Base.metadata.sorted_tables:
+            for statement in _create_table_sql(table):
+                cursor.execute(statement)
+        print("Columnar store tables created successfully (if they didn't exist).")
+    finally:
+        cursor.close()
+
+
+def compile_statement(stmt) -> str:
+    """
+    Renders a SQLAlchemy Core statement as a literal SQL string. DuckDB understands the
+    PostgreSQL dialect for everything the app emits (date_trunc, extract(isodow), floor, ...).
+    """
+    return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def fetch_frame(stmt) -> pd.DataFrame:
+    cursor = get_connection().cursor()
+    try:
+        return cursor.execute(compile_statement(stmt)).df()
+    finally:
+        cursor.close()
+
+
+def fetch_mappings(stmt) -> List[Dict[str, Any]]:
+    """Runs a select and returns one dict per row, like `Result.mappings()`."""
+    cursor = get_connection().cursor()
+    try:
+        cursor.execute(compile_statement(stmt))
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def execute_statements(statements: Iterable[Any]) -> None:
+    """Executes several Core statements in one transaction."""
+    cursor = get_connection().cursor()
+    try:
+        cursor.execute("BEGIN TRANSACTION")
+        try:
+            for stmt in statements:
+                cursor.execute(compile_statement(stmt))
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    finally:
+        cursor.close()
+
+
+def load_visitor_frame(
+    columns: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+    site_id: Optional[str] = None
+) -> pd.DataFrame:
+    """Scans visitor_data (newest first) and returns only the requested columns."""
+    select_list = ", ".join(columns) if columns else "* EXCLUDE (id)"
+    sql = f"SELECT {select_list} FROM visitor_data"
+    params: List[Any] = []
+    if site_id is not None:
+        sql += " WHERE site_id = ?"
+        params.append(site_id)
+    sql += " ORDER BY date DESC"
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+
+    cursor = get_connection().cursor()
+    try:
+        df = cursor.execute(sql, params).df()
+    finally:
+        cursor.close()
+
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def ingest_visitor_data(df: pd.DataFrame, site_id: Optional[str] = None) -> int:
+    """
+    Upserts daily visitor rows (keyed on site and date) from a DataFrame whose columns are a
+    subset of visitor_data. Rows without a site_id column are assigned to `site_id`
+    (default: DEFAULT_SITE_ID). Returns the number of rows written.
+    """
+    from backend.models_db import VisitorDataDb
+
+    known = [c.name for c in VisitorDataDb.__table__.columns if c.name != 'id']
+    columns = [c for c in df.columns if c in known]
+    if 'date' not in columns or 'visitor_count' not in columns:
+        raise ValueError("Visitor data must contain at least 'date' and 'visitor_count' columns.")
+
+    batch = df[columns].copy()
+    batch['date'] = pd.to_datetime(batch['date']).dt.date
+    if 'site_id' not in batch.columns:
+        batch['site_id'] = site_id or settings.DEFAULT_SITE_ID
+        columns.append('site_id')
+
+    updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c not in ('site_id', 'date'))
+    cursor = get_connection().cursor()
+    try:
+        cursor.register("incoming_visitor_data", batch)
+        cursor.execute("BEGIN TRANSACTION")
+        try:
+            cursor.execute(
+                f"INSERT INTO visitor_data ({', '.join(columns)}) "
+                f"SELECT {', '.join(columns)} FROM incoming_visitor_data "
+                f"ON CONFLICT (site_id, date) DO UPDATE SET {updates}"
+            )
+            # Bump each touched site's data version; the analytics cache fingerprints include it.
+            cursor.execute(
+                "INSERT INTO visitor_data_versions (site_id, version, updated_at) "
+                "SELECT DISTINCT site_id, 1, now() FROM incoming_visitor_data "
+                "ON CONFLICT (site_id) DO UPDATE SET version = visitor_data_versions.version + 1, "
+                "updated_at = excluded.updated_at"
+            )
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        cursor.unregister("incoming_visitor_data")
+    finally:
+        cursor.close()
+
+    from backend import analytics  # Imported late: analytics itself imports this module lazily
+    analytics.invalidate_analytics_cache(batch['site_id'].unique())
+    return len(batch)
+
+
+def record_live_visitor_count(
+    visitor_count: int,
+    timestamp: Optional[datetime] = None,
+    site_id: Optional[str] = None
+) -> None:
+    cursor = get_connection().cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO live_visitor_counts (site_id, timestamp, visitor_count) VALUES (?, ?, ?)",
+            [site_id or settings.DEFAULT_SITE_ID, timestamp or datetime.utcnow(), int(visitor_count)]
+        )
+    finally:
+        cursor.close()
+
+
+def load_live_visitor_counts(since: Optional[date] = None, site_id: Optional[str] = None) -> pd.DataFrame:
+    sql = "SELECT timestamp, visitor_count FROM live_visitor_counts WHERE site_id = ?"
+    params: List[Any] = [site_id or settings.DEFAULT_SITE_ID]
+    if since is not None:
+        sql += " AND timestamp >= ?"
+        params.append(since)
+    sql += " ORDER BY timestamp"
+
+    cursor = get_connection().cursor()
+    try:
+        return cursor.execute(sql, params).df()
+    finally:
+        cursor.close()
+
+
+if __name__ == "__main__":
+    # Usage: python -m backend.columnar_store <visitor_data.csv> [site_id]
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python -m backend.columnar_store <visitor_data.csv> [site_id]")
+        sys.exit(1)
+
+    init_schema()
+    written = ingest_visitor_data(pd.read_csv(sys.argv[1]), site_id=sys.argv[2] if len(sys.argv) == 3 else None)
+    print(f"Ingested {written} rows into {settings.COLUMNAR_DB_PATH}")
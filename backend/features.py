@@ -1,17 +1,51 @@
+import numpy as np
 import pandas as pd
 from typing import List, Dict, Any, Optional
 
 # Define the feature list that the model will expect.
 # This helps ensure consistency between training and prediction.
 # These are examples; the actual list will depend on what's available and useful.
-MODEL_FEATURES = [
+# Weather features are read as-is from the input; date features are derived by create_date_features.
+WEATHER_FEATURES = [
     'temp', 'feels_like', 'temp_min', 'temp_max', 'humidity', 'wind_speed',
     'pop', # probability of precipitation
-    'day_of_week', 'month', 'week_of_year', 'year', 'day_of_year', 'is_weekend',
+]
+DATE_FEATURES = ['day_of_week', 'month', 'week_of_year', 'year', 'day_of_year', 'is_weekend']
+
+MODEL_FEATURES = WEATHER_FEATURES + DATE_FEATURES + [
     # 'is_holiday', 'is_school_break', # Future additions
     # 'special_event_type_encoded' # Future additions
 ]
 
+def date_feature_arrays(dates: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Computes DATE_FEATURES from an array of dates in a handful of vectorized numpy operations.
+    Shared by the DataFrame pipeline and the bulk scenario scorer so both see identical features.
+    Missing dates (NaT) get 0 for every feature, as the pandas pipeline filled them.
+    """
+    days = np.asarray(dates).astype('datetime64[D]')
+    day_of_week = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday; Monday=0, Sunday=6
+    year_start = days.astype('datetime64[Y]')
+
+    # ISO week: the week (Monday-Sunday) belongs to the year containing its Thursday.
+    thursday = days + (3 - day_of_week).astype('timedelta64[D]')
+    iso_week = (thursday - thursday.astype('datetime64[Y]')).astype(np.int64) // 7 + 1
+
+    features = {
+        'day_of_week': day_of_week,
+        'month': days.astype('datetime64[M]').astype(np.int64) % 12 + 1,
+        'week_of_year': iso_week,
+        'year': year_start.astype(np.int64) + 1970,
+        'day_of_year': (days - year_start).astype(np.int64) + 1,
+        'is_weekend': (day_of_week >= 5).astype(np.int64),  # Saturday=5, Sunday=6
+    }
+
+    # NaT is int64-min underneath, so the arithmetic above yields garbage for it.
+    missing = np.isnat(days)
+    if missing.any():
+        features = {name: np.where(missing, 0, values) for name, values in features.items()}
+    return features
+
 def create_date_features(df: pd.DataFrame, date_column: str = 'date') -> pd.DataFrame:
     """
     Creates comprehensive date-based features from a date column.
@@ -20,15 +54,36 @@ def create_date_features(df: pd.DataFrame, date_column: str = 'date') -> pd.Data
     df_copy = df.copy()
     df_copy[date_column] = pd.to_datetime(df_copy[date_column])
 
-    df_copy['day_of_week'] = df_copy[date_column].dt.dayofweek  # Monday=0, Sunday=6
-    df_copy['month'] = df_copy[date_column].dt.month
-    df_copy['week_of_year'] = df_copy[date_column].dt.isocalendar().week.astype(int)
-    df_copy['year'] = df_copy[date_column].dt.year
-    df_copy['day_of_year'] = df_copy[date_column].dt.dayofyear
-    df_copy['is_weekend'] = df_copy['day_of_week'].isin([5, 6]).astype(int)  # Saturday=5, Sunday=6
+    for name, values in date_feature_arrays(df_copy[date_column].to_numpy()).items():
+        df_copy[name] = values
 
     return df_copy
 
+def build_feature_matrix(
+    dates: np.ndarray,
+    weather: Dict[str, np.ndarray],
+    dtype=np.float32
+) -> np.ndarray:
+    """
+    Builds a (rows x MODEL_FEATURES) matrix straight from column arrays, without a DataFrame
+    round trip. Missing or NaN weather values become 0, as in prepare_features_for_model.
+    float32 matches what the tree models convert their input to, so no further copy is made.
+    """
+    n_rows = len(dates)
+    date_features = date_feature_arrays(dates)
+    matrix = np.empty((n_rows, len(MODEL_FEATURES)), dtype=dtype)
+
+    for i, feature in enumerate(MODEL_FEATURES):
+        if feature in date_features:
+            matrix[:, i] = date_features[feature]
+        elif feature in weather:
+            matrix[:, i] = weather[feature]
+        else:
+            matrix[:, i] = 0
+
+    np.nan_to_num(matrix, copy=False, nan=0.0)
+    return matrix
+
 def prepare_features_for_model(
     input_df: pd.DataFrame,
     target_column: Optional[str] = 'visitor_count',
@@ -0,0 +1,396 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+# Offline load-test harness for /api/visitor_forecast.
+#
+#   python -m backend.loadtest run --workers 2 --clients 50 --duration 30 --upstream-latency-ms 150
+#
+# Trains a model on synthetic history into a throwaway model directory (unless --model-dir is
+# given), starts a fake OpenWeather /forecast server and the FastAPI app pointed at both, drives
+# the forecast endpoint with concurrent clients and reports throughput, latency percentiles,
+# forecasts without a prediction and the number of upstream weather calls.
+
+DEFAULT_POSTAL_CODES = ["10115", "21502", "20095", "80331", "50667"]
+FORECAST_DAYS = 5  # OpenWeather's 3-hourly forecast covers five days
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# A run where more than this share of responses carry no prediction is reported as failed.
+MAX_PREDICTION_ERROR_SHARE = 0.5
+
+
+# --- Fake OpenWeather server ---
+
+def create_fake_openweather_app(latency_ms: float, latency_jitter_ms: float, error_rate: float, seed: int):
+    from fastapi import FastAPI, Query
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI(title="Fake OpenWeather")
+    rng = random.Random(seed)
+    stats: Counter = Counter()
+
+    def _entries(zip_query: str, count: int) -> List[Dict[str, Any]]:
+        # Deterministic per location, so repeated calls return the same forecast.
+        location_rng = random.Random(f"{seed}:{zip_query}")
+        start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        entries = []
+        for i in range(count):
+            ts = start + timedelta(hours=3 * i)
+            temp = 12 + 10 * location_rng.random() + 4 * np.sin((ts.hour - 9) / 24 * 2 * np.pi)
+            pop = round(location_rng.random() * 0.8, 2)
+            entries.append({
+                "dt": int(ts.timestamp()),
+                "dt_txt": ts.strftime("%Y-%m-%d %H:%M:%S"),
+                "main": {
+                    "temp": round(temp, 1),
+                    "feels_like": round(temp - 1.5, 1),
+                    "temp_min": round(temp - 3, 1),
+                    "temp_max": round(temp + 3, 1),
+                    "pressure": 1013,
+                    "humidity": location_rng.randint(40, 90),
+                },
+                "weather": [{"main": "Clouds", "description": "scattered clouds", "icon": "03d"}],
+                "wind": {"speed": round(location_rng.random() * 8, 1), "deg": location_rng.randint(0, 359)},
+                "clouds": {"all": location_rng.randint(0, 100)},
+                "pop": pop,
+                "rain": {"3h": round(pop * 2, 2)} if pop > 0.5 else {},
+            })
+        return entries
+
+    @app.get("/forecast")
+    async def forecast(zip: str = Query(...), cnt: int = Query(40)):
+        stats["calls"] += 1
+        delay = max(0.0, latency_ms + rng.uniform(-latency_jitter_ms, latency_jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+
+        if rng.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse(status_code=503, content={"cod": 503, "message": "injected failure"})
+
+        return {"cod": "200", "cnt": cnt, "list": _entries(zip, min(cnt, FORECAST_DAYS * 8))}
+
+    @app.get("/__stats")
+    async def get_stats():
+        return dict(stats)
+
+    @app.post("/__reset")
+    async def reset_stats():
+        stats.clear()
+        return {}
+
+    return app
+
+
+def serve_fake_openweather(args) -> None:
+    import uvicorn
+
+    app = create_fake_openweather_app(args.latency_ms, args.latency_jitter_ms, args.error_rate, args.seed)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# --- Synthetic model ---
+
+def seed_synthetic_model(args) -> None:
+    """
+    Writes a synthetic visitor history into the columnar store and trains the default site's
+    model from it. Runs in a subprocess whose environment points storage and MODEL_DIR at the
+    harness's temp directory, so nothing outside it is touched.
+    """
+    import pandas as pd
+    from backend import columnar_store, ml_trainer
+
+    rng = np.random.default_rng(args.seed)
+    dates = pd.date_range(end=date.today() - timedelta(days=1), periods=args.history_days, freq="D")
+    season = np.sin((dates.dayofyear.to_numpy() - 110) / 365 * 2 * np.pi)
+    temp = 12 + 12 * season + rng.normal(0, 3, len(dates))
+    pop = rng.beta(1.2, 3.0, len(dates))
+    weekend = (dates.dayofweek.to_numpy() >= 5).astype(float)
+    visitors = 150 + 18 * np.clip(temp, 0, None) - 180 * pop + 220 * weekend + rng.normal(0, 40, len(dates))
+
+    history = pd.DataFrame({
+        "date": dates.date,
+        "visitor_count": np.clip(visitors, 0, None).astype(int),
+        "temp": temp.round(1),
+        "feels_like": (temp - 1.5).round(1),
+        "temp_min": (temp - 3).round(1),
+        "temp_max": (temp + 3).round(1),
+        "humidity": rng.integers(40, 90, len(dates)),
+        "wind_speed": (rng.random(len(dates)) * 8).round(1),
+        "pop": pop.round(2),
+    })
+
+    columnar_store.init_schema()
+    print(f"Seeded {columnar_store.ingest_visitor_data(history)} synthetic history rows.")
+    if ml_trainer.train_model() is None:
+        sys.exit("Training the synthetic model failed.")
+
+
+# --- Process orchestration ---
+
+def _wait_until_ready(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def _start_fake_openweather(args) -> subprocess.Popen:
+    return subprocess.Popen([
+        sys.executable, "-m", "backend.loadtest", "fake-openweather",
+        "--port", str(args.upstream_port),
+        "--latency-ms", str(args.upstream_latency_ms),
+        "--latency-jitter-ms", str(args.upstream_jitter_ms),
+        "--error-rate", str(args.upstream_error_rate),
+        "--seed", str(args.seed),
+    ], cwd=PROJECT_ROOT)
+
+
+def _harness_env(data_dir: str, model_dir: str) -> Dict[str, str]:
+    # Keep the run self-contained: no PostgreSQL, throwaway columnar store and model directory.
+    return {
+        **os.environ,
+        "STORAGE_BACKEND": "duckdb",
+        "COLUMNAR_DB_PATH": os.path.join(data_dir, "loadtest.duckdb"),
+        "MODEL_DIR": model_dir,
+        "MODEL_BENCHMARK_ENABLED": "false",
+    }
+
+
+def _prepare_model(args, data_dir: str) -> str:
+    """Returns the model directory to serve from, training a synthetic model if none was given."""
+    if args.model_dir:
+        return os.path.abspath(args.model_dir)
+
+    model_dir = os.path.join(data_dir, "models")
+    print("Training a model on synthetic history...")
+    subprocess.run([
+        sys.executable, "-m", "backend.loadtest", "seed-model",
+        "--history-days", str(args.history_days),
+        "--seed", str(args.seed),
+    ], env=_harness_env(data_dir, model_dir), cwd=PROJECT_ROOT, check=True)
+    return model_dir
+
+
+def _start_backend(args, data_dir: str, model_dir: str) -> subprocess.Popen:
+    env = {
+        **_harness_env(data_dir, model_dir),
+        "OPENWEATHER_BASE_URL": f"http://127.0.0.1:{args.upstream_port}",
+        "OPENWEATHER_API_KEY": "loadtest",
+        # The forecast path doesn't read storage; skipping init keeps the workers off the
+        # single-writer DuckDB file, so --workers > 1 doesn't contend for its lock.
+        "DB_INIT_ON_STARTUP": "false",
+    }
+    if args.weather_cache_seconds is not None:
+        env["WEATHER_CACHE_SECONDS"] = str(args.weather_cache_seconds)
+    return subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "backend.main:app",
+        "--host", "127.0.0.1", "--port", str(args.port),
+        "--workers", str(args.workers),
+        "--log-level", "warning",
+    ], env=env, cwd=PROJECT_ROOT)
+
+
+# --- Load generation ---
+
+def _random_query(rng: random.Random, postal_codes: List[str], max_range_days: int) -> Dict[str, str]:
+    # Ranges start today: the backend fetches `num_days` of forecast counted from today, so a
+    # later start would be answered with 404 and measure the wrong path.
+    start = date.today()
+    length = rng.randint(1, min(max_range_days, FORECAST_DAYS))
+    end = start + timedelta(days=length - 1)
+    return {
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "postal_code": rng.choice(postal_codes),
+    }
+
+
+async def _client(
+    client: httpx.AsyncClient,
+    rng: random.Random,
+    args,
+    deadline: float,
+    latencies: List[float],
+    statuses: Counter
+) -> None:
+    while time.monotonic() < deadline:
+        params = _random_query(rng, args.postal_codes, args.max_range_days)
+        if args.quantiles:
+            params["quantiles"] = args.quantiles
+
+        started = time.perf_counter()
+        try:
+            response = await client.get("/api/visitor_forecast", params=params)
+            statuses[response.status_code] += 1
+        except httpx.HTTPError as e:
+            statuses[type(e).__name__] += 1
+            response = None
+        latencies.append(time.perf_counter() - started)
+
+        # A 200 can still carry no prediction (predicted_visitors=-1, e.g. no model loaded).
+        if response is not None and response.status_code == 200:
+            forecasts = response.json().get("forecasts", [])
+            if any(f.get("predicted_visitors", -1) < 0 for f in forecasts):
+                statuses["prediction_errors"] += 1
+
+
+async def drive_load(args) -> Dict[str, Any]:
+    base_url = f"http://127.0.0.1:{args.port}"
+    upstream_url = f"http://127.0.0.1:{args.upstream_port}"
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        # Warm-up traffic is excluded from the statistics and upstream counts.
+        if args.warmup > 0:
+            warmup_deadline = time.monotonic() + args.warmup
+            await asyncio.gather(*[
+                _client(client, random.Random(args.seed + 10_000 + i), args, warmup_deadline, [], Counter())
+                for i in range(args.clients)
+            ])
+        await client.post(f"{upstream_url}/__reset")
+
+        started = time.monotonic()
+        deadline = started + args.duration
+        await asyncio.gather(*[
+            _client(client, random.Random(args.seed + i), args, deadline, latencies, statuses)
+            for i in range(args.clients)
+        ])
+        elapsed = time.monotonic() - started
+        upstream = (await client.get(f"{upstream_url}/__stats")).json()
+
+    prediction_errors = statuses.pop("prediction_errors", 0)
+    latency_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+
+    return {
+        "workers": args.workers,
+        "clients": args.clients,
+        "weather_cache_seconds": args.weather_cache_seconds,
+        "duration_s": round(elapsed, 2),
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(float(np.percentile(latency_ms, 50)), 1),
+            "p95": round(float(np.percentile(latency_ms, 95)), 1),
+            "p99": round(float(np.percentile(latency_ms, 99)), 1),
+            "max": round(float(latency_ms.max()), 1),
+        },
+        "status_counts": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+        "prediction_errors": prediction_errors,
+        "upstream_calls": upstream.get("calls", 0),
+        "upstream_errors": upstream.get("errors", 0),
+    }
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print("\n=== Load test report ===")
+    print(f"Workers: {report['workers']}, clients: {report['clients']}, duration: {report['duration_s']}s")
+    print(f"Requests: {report['requests']} ({report['throughput_rps']} req/s)")
+    latency = report['latency_ms']
+    print(f"Latency ms: p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} max={latency['max']}")
+    print(f"Status codes: {report['status_counts']}")
+    print(f"Responses without a prediction: {report['prediction_errors']}")
+    print(f"Upstream calls: {report['upstream_calls']} (errors injected: {report['upstream_errors']})")
+
+
+def run(args) -> Dict[str, Any]:
+    processes: List[subprocess.Popen] = []
+    with tempfile.TemporaryDirectory(prefix="swim-loadtest-") as data_dir:
+        try:
+            processes.append(_start_fake_openweather(args))
+            _wait_until_ready(f"http://127.0.0.1:{args.upstream_port}/__stats")
+
+            model_dir = _prepare_model(args, data_dir)
+            processes.append(_start_backend(args, data_dir, model_dir))
+            _wait_until_ready(f"http://127.0.0.1:{args.port}/")
+
+            report = asyncio.run(drive_load(args))
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    _print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+
+    if report["requests"] and report["prediction_errors"] / report["requests"] > MAX_PREDICTION_ERROR_SHARE:
+        sys.exit("Most responses carried no prediction; the numbers above don't measure the model path.")
+    return report
+
+
+def _parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline load test for the visitor forecast API.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    fake = sub.add_parser("fake-openweather", help="Run only the fake OpenWeather server.")
+    fake.add_argument("--port", type=int, default=8900)
+    fake.add_argument("--latency-ms", type=float, default=100.0)
+    fake.add_argument("--latency-jitter-ms", type=float, default=20.0)
+    fake.add_argument("--error-rate", type=float, default=0.0)
+    fake.add_argument("--seed", type=int, default=42)
+
+    seed = sub.add_parser("seed-model", help="Train a model on synthetic history (uses MODEL_DIR / COLUMNAR_DB_PATH).")
+    seed.add_argument("--history-days", type=int, default=730)
+    seed.add_argument("--seed", type=int, default=42)
+
+    load = sub.add_parser("run", help="Start fake upstream + backend and drive load.")
+    load.add_argument("--port", type=int, default=8800, help="Port for the backend under test.")
+    load.add_argument("--workers", type=int, default=1, help="uvicorn worker processes.")
+    load.add_argument("--clients", type=int, default=20, help="Concurrent clients.")
+    load.add_argument("--duration", type=float, default=30.0, help="Measured seconds of load.")
+    load.add_argument("--warmup", type=float, default=3.0, help="Unmeasured warm-up seconds.")
+    load.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds.")
+    load.add_argument("--postal-codes", nargs="+", default=DEFAULT_POSTAL_CODES)
+    load.add_argument("--max-range-days", type=int, default=FORECAST_DAYS)
+    load.add_argument("--quantiles", default=None, help="Also request intervals, e.g. '10,50,90'.")
+    load.add_argument("--upstream-port", type=int, default=8900)
+    load.add_argument("--upstream-latency-ms", type=float, default=100.0)
+    load.add_argument("--upstream-jitter-ms", type=float, default=20.0)
+    load.add_argument("--upstream-error-rate", type=float, default=0.0)
+    load.add_argument(
+        "--weather-cache-seconds", type=int, default=None,
+        help="Backend weather cache lifetime (WEATHER_CACHE_SECONDS); 0 sends every request upstream."
+    )
+    load.add_argument("--model-dir", default=None, help="Serve existing models from here instead of a synthetic one.")
+    load.add_argument("--history-days", type=int, default=730, help="Days of synthetic history to train on.")
+    load.add_argument("--seed", type=int, default=42)
+    load.add_argument("--json", default=None, help="Also write the report to this JSON file.")
+
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    # Add project root to path if running directly
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+
+    cli_args = _parse_args()
+    if cli_args.command == "fake-openweather":
+        serve_fake_openweather(cli_args)
+    elif cli_args.command == "seed-model":
+        seed_synthetic_model(cli_args)
+    else:
+        run(cli_args)
@@ -1,33 +1,47 @@
-from fastapi import FastAPI, HTTPException, Query, Depends
+from fastapi import FastAPI, HTTPException, Query, Depends, Header, Request
+from fastapi.responses import FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
 from typing import List, Optional, Dict, Any
 from datetime import date, timedelta, datetime
-from sqlalchemy.orm import Session
+import math
 import os
 import sys
 
 # Standardized imports from backend package
-from backend import services, predictor, schemas, ml_trainer, database
+from backend import services, predictor, schemas, ml_trainer, model_engines, database, analytics, backtest, profiling, scenarios, sensitivity
+from backend.core.config import settings
 
 # --- Application Lifespan (init DB + model) ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Application startup: Initializing database and loading ML model...")
 
-    try:
-        database.create_db_and_tables()
-        print("Database tables checked/created.")
-    except Exception as e:
-        print(f"CRITICAL: Could not initialize database tables: {e}")
+    # Reject a misconfigured MODEL_ENGINE now rather than at the first (background) retrain.
+    model_engines.engine_params(settings.MODEL_ENGINE)
+
+    if not settings.DB_INIT_ON_STARTUP:
+        print("Skipping database initialization (DB_INIT_ON_STARTUP is off).")
+    else:
+        try:
+            if settings.use_columnar_store:
+                from backend import columnar_store
+                columnar_store.init_schema()
+            else:
+                database.create_db_and_tables()
+            print("Database tables checked/created.")
+        except Exception as e:
+            print(f"CRITICAL: Could not initialize database tables: {e}")
 
-    predictor.load_trained_model()
-    if predictor.loaded_model is None:
+    # Only the default site is loaded eagerly; other sites load into the pool on first use.
+    if predictor.load_trained_model(settings.DEFAULT_SITE_ID) is None:
         print("WARNING: ML Model could not be loaded at startup.")
     else:
         print("ML Model loaded successfully.")
 
     yield
+    await database.async_engine.dispose()
     print("Application shutdown.")
 
 app = FastAPI(
@@ -46,6 +60,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- On-demand request profiling (only installed when enabled, so zero cost otherwise) ---
+if settings.PROFILING_ENABLED:
+    if profiling.is_available():
+        app.add_middleware(profiling.RequestProfilerMiddleware)
+        print("Request profiling enabled (token-guarded).")
+    else:
+        print("WARNING: PROFILING_ENABLED is set but pyinstrument is not installed; profiling disabled.")
+
+# --- Shared dependencies ---
+def get_site_id(
+    site_id: str = Query(settings.DEFAULT_SITE_ID, description="Site (pool) to serve.")
+) -> str:
+    if not predictor.is_valid_site_id(site_id):
+        raise HTTPException(status_code=400, detail=f"Invalid site_id '{site_id}'.")
+    # Only configured sites are served, so arbitrary ids can't fill the model pool's bookkeeping.
+    if site_id != settings.DEFAULT_SITE_ID and site_id not in settings.SITE_IDS:
+        raise HTTPException(status_code=404, detail=f"Unknown site_id '{site_id}'.")
+    return site_id
+
 # --- Routes ---
 @app.get("/")
 async def root():
@@ -57,8 +90,30 @@ async def get_visitor_forecast(
     end_date: date = Query(None),
     postal_code: Optional[str] = Query("10115"),
     country_code: Optional[str] = Query("DE"),
-    db: Session = Depends(database.get_db)
+    quantiles: Optional[str] = Query(
+        None,
+        description="Comma-separated percentiles for prediction intervals, e.g. '10,50,90'."
+    ),
+    site_id: str = Depends(get_site_id)
 ):
+    quantile_list = None
+    if quantiles:
+        try:
+            quantile_list = [float(q) for q in quantiles.split(",") if q.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Quantiles must be comma-separated numbers.")
+        if not quantile_list or any(not math.isfinite(q) or q < 0 or q > 100 for q in quantile_list):
+            raise HTTPException(status_code=400, detail="Quantiles must be between 0 and 100.")
+
+        # Checked before the weather call; loading the model may hit the disk.
+        loaded = await run_in_threadpool(predictor.model_pool.get, site_id)
+        if loaded is not None and loaded.leaf_table is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Quantiles are only available for tree-ensemble models (MODEL_ENGINE=random_forest); "
+                       f"site '{site_id}' uses {type(loaded.model).__name__}."
+            )
+
     if start_date is None:
         start_date = date.today()
     if end_date is None:
@@ -68,7 +123,7 @@ async def get_visitor_forecast(
         raise HTTPException(status_code=400, detail="Start date cannot be after end date.")
 
     num_days = (end_date - start_date).days + 1
-    print(f"Forecast request: {start_date} to {end_date} ({num_days} days), postal code: {postal_code}")
+    print(f"Forecast request: {start_date} to {end_date} ({num_days} days), postal code: {postal_code}, site: {site_id}")
 
     try:
         weather_forecast_list = services.get_weather_forecast_data(
@@ -91,7 +146,9 @@ async def get_visitor_forecast(
         raise HTTPException(status_code=404, detail="Weather data does not match requested range.")
 
     try:
-        predictions = predictor.predict_visitor_counts(filtered)
+        predictions = predictor.predict_visitor_counts(filtered, quantiles=quantile_list, site_id=site_id)
+    except predictor.QuantilesNotSupportedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
@@ -122,7 +179,8 @@ async def get_visitor_forecast(
             final.append(schemas.VisitorForecastOutput(
                 date=date_obj,
                 predicted_visitors=pred["predicted_visitors"],
-                weather_forecast=weather_data
+                weather_forecast=weather_data,
+                quantiles=pred.get("quantiles")
             ))
 
     if not final:
@@ -130,18 +188,213 @@ async def get_visitor_forecast(
 
     return schemas.VisitorForecastResponse(forecasts=final)
 
+@app.post("/api/score_scenarios")
+async def score_scenarios(request: Request, site_id: str = Depends(get_site_id)):
+    """
+    Scores a batch of hypothetical days in one call. The body is an Arrow IPC stream or a
+    structured .npy array with a `date` column plus weather feature columns; the response uses
+    the same format and holds `date` and `predicted_visitors` (and `scenario_id` if sent).
+    """
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if media_type not in scenarios.SUPPORTED_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Unsupported content type. Use one of: {', '.join(scenarios.SUPPORTED_MEDIA_TYPES)}."
+        )
+
+    # Reject oversized batches before buffering them; chunked bodies are capped while reading.
+    too_large = HTTPException(
+        status_code=413, detail=f"Scenario batch exceeds {settings.SCENARIO_MAX_BYTES} bytes."
+    )
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > settings.SCENARIO_MAX_BYTES:
+        raise too_large
+
+    chunks = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > settings.SCENARIO_MAX_BYTES:
+            raise too_large
+        chunks.append(chunk)
+    body = b"".join(chunks)
+
+    try:
+        result = await run_in_threadpool(
+            scenarios.score_scenarios, body, media_type, site_id, settings.SCENARIO_MAX_ROWS
+        )
+    except scenarios.ScenarioInputError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except scenarios.ModelNotAvailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Scenario scoring failed: {str(e)}")
+
+    return Response(content=result, media_type=media_type)
+
+def get_sensitivity_surface(site_id: str = Depends(get_site_id)) -> sensitivity.SensitivitySurface:
+    if not settings.SENSITIVITY_ENABLED:
+        raise HTTPException(status_code=404, detail="Sensitivity surfaces are disabled.")
+    surface = sensitivity.surface_store.get(site_id)
+    if surface is None:
+        # Loading the model schedules the computation. If it was already loaded, an earlier
+        # computation failed (or is still running), so (re)schedule it; the caller retries shortly.
+        entry = predictor.model_pool.get(site_id)
+        if entry is not None:
+            sensitivity.surface_store.on_model_loaded(entry)
+        raise HTTPException(status_code=503, detail=f"Sensitivity surface for site '{site_id}' is not ready yet.")
+    return surface
+
+@app.get("/api/sensitivity", response_model=schemas.SensitivityPoint)
+async def get_sensitivity(
+    month: int = Query(..., ge=1, le=12),
+    weekday: int = Query(..., ge=0, le=6, description="Monday=0"),
+    temp: float = Query(...),
+    pop: float = Query(0.0, ge=0, le=1),
+    surface: sensitivity.SensitivitySurface = Depends(get_sensitivity_surface)
+):
+    return schemas.SensitivityPoint(
+        site_id=surface.site_id,
+        month=month,
+        weekday=weekday,
+        temp=temp,
+        pop=pop,
+        expected_visitors=sensitivity.lookup(surface, month, weekday, temp, pop)
+    )
+
+@app.get("/api/sensitivity/surface", response_model=schemas.SensitivitySurfaceResponse)
+async def get_sensitivity_slice(
+    month: int = Query(..., ge=1, le=12),
+    weekday: int = Query(..., ge=0, le=6, description="Monday=0"),
+    surface: sensitivity.SensitivitySurface = Depends(get_sensitivity_surface)
+):
+    return sensitivity.surface_slice(surface, month, weekday)
+
+@app.get("/api/analytics/aggregates/{period}", response_model=schemas.PeriodAggregateResponse)
+async def get_period_aggregates(
+    period: str,
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    site_id: str = Depends(get_site_id),
+    db: database.LazyAsyncSession = Depends(database.get_async_db)
+):
+    if period not in analytics.AGGREGATE_PERIODS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported period '{period}'. Use one of: {', '.join(analytics.AGGREGATE_PERIODS)}."
+        )
+
+    aggregates = await analytics.get_period_aggregates(db, period, start_date, end_date, site_id)
+    return schemas.PeriodAggregateResponse(period=period, aggregates=aggregates)
+
+@app.get("/api/analytics/weekday", response_model=schemas.WeekdayAggregateResponse)
+async def get_weekday_aggregates(
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    site_id: str = Depends(get_site_id),
+    db: database.LazyAsyncSession = Depends(database.get_async_db)
+):
+    aggregates = await analytics.get_weekday_aggregates(db, start_date, end_date, site_id)
+    return schemas.WeekdayAggregateResponse(aggregates=aggregates)
+
+@app.get("/api/analytics/temperature_buckets", response_model=schemas.TemperatureBucketResponse)
+async def get_temperature_buckets(
+    bucket_width: float = Query(analytics.DEFAULT_TEMP_BUCKET_WIDTH, gt=0),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    site_id: str = Depends(get_site_id),
+    db: database.LazyAsyncSession = Depends(database.get_async_db)
+):
+    buckets = await analytics.get_temperature_buckets(db, bucket_width, start_date, end_date, site_id)
+    return schemas.TemperatureBucketResponse(bucket_width=bucket_width, buckets=buckets)
+
+@app.get("/api/visitor_data", response_model=schemas.VisitorDataPage)
+async def list_visitor_data(
+    after: Optional[date] = Query(None, description="Keyset cursor: return rows strictly after this date."),
+    limit: int = Query(analytics.DEFAULT_PAGE_SIZE, ge=1, le=analytics.MAX_PAGE_SIZE),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    site_id: str = Depends(get_site_id),
+    db: database.LazyAsyncSession = Depends(database.get_async_db)
+):
+    return await analytics.get_visitor_data_page(db, after, limit, start_date, end_date, site_id)
+
+@app.post("/api/backtest/run", response_model=schemas.BacktestRunResponse)
+async def trigger_backtest(
+    step_days: int = Query(backtest.DEFAULT_STEP_DAYS, ge=1),
+    horizon_days: int = Query(backtest.DEFAULT_HORIZON_DAYS, ge=1),
+    force: bool = Query(False, description="Recompute every cutoff, even unchanged ones."),
+    site_id: str = Depends(get_site_id)
+):
+    try:
+        return await run_in_threadpool(
+            backtest.run_backtest,
+            site_id=site_id,
+            step_days=step_days,
+            horizon_days=horizon_days,
+            force=force
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Backtest failed: {str(e)}")
+
+@app.get("/api/backtest/results", response_model=schemas.BacktestResultsResponse)
+async def get_backtest_results(
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    days_ahead: Optional[int] = Query(None, ge=1),
+    site_id: str = Depends(get_site_id),
+    db: database.LazyAsyncSession = Depends(database.get_async_db)
+):
+    rows = await backtest.get_backtest_results(db, site_id, start_date, end_date, days_ahead)
+    return schemas.BacktestResultsResponse(results=rows)
+
+@app.get("/api/metrics/db_pool")
+async def get_db_pool_metrics():
+    return database.get_pool_metrics()
+
+@app.get("/api/metrics/model_pool")
+async def get_model_pool_metrics():
+    return predictor.model_pool.stats()
+
+def require_profiling_token(x_profile_token: Optional[str] = Header(None)) -> None:
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled.")
+    if not profiling.is_authorized(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profiling token.")
+
+@app.get("/api/profiles", dependencies=[Depends(require_profiling_token)])
+async def list_profiles():
+    return {"profiles": profiling.list_profiles()}
+
+@app.get("/api/profiles/{name}", dependencies=[Depends(require_profiling_token)])
+async def download_profile(name: str):
+    path = profiling.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return FileResponse(path, media_type="application/json", filename=name)
+
 @app.post("/api/retrain_model", status_code=202)
-async def trigger_retrain_model():
+async def trigger_retrain_model(
+    site_id: Optional[str] = Query(None, description="Site to retrain. Omit to retrain all configured sites.")
+):
+    if site_id is not None:
+        site_id = get_site_id(site_id)
+    site_ids = [site_id] if site_id else settings.SITE_IDS
+
     try:
-        ml_trainer.train_model()
-        predictor.load_trained_model()
-        if predictor.loaded_model:
-            return {"message": "Model retrained and reloaded successfully."}
-        else:
-            raise HTTPException(status_code=500, detail="Model reload failed after retraining.")
+        trained = await run_in_threadpool(ml_trainer.train_models_for_sites, site_ids)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Retraining failed: {str(e)}")
 
+    failed = []
+    for site, path in trained.items():
+        # joblib.load is blocking, so reloads stay off the event loop as well.
+        if path is None or await run_in_threadpool(predictor.load_trained_model, site) is None:
+            failed.append(site)
+    if failed:
+        raise HTTPException(status_code=500, detail=f"Retraining or reload failed for sites: {', '.join(failed)}")
+    return {"message": "Model retrained and reloaded successfully.", "sites": site_ids}
+
 
 # --- Local run fallback ---
 if __name__ == "__main__":
@@ -1,29 +1,94 @@
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score
 import joblib
+from threadpoolctl import threadpool_limits
+import json
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
 
-from backend import services, features
-from backend.database import SessionLocal
+from backend import services, features, model_engines, profiling
+from backend.core.config import settings
+from backend.database import SessionLocal, engine
+from backend.predictor import model_path_for_site
 
 TARGET_COLUMN = 'visitor_count'
-MODEL_DIR = os.path.join(os.path.dirname(__file__), "models")
+# Only these columns are read from storage for training; date features are derived from 'date'.
+TRAINING_COLUMNS = ['date', TARGET_COLUMN] + features.WEATHER_FEATURES
+MODEL_DIR = settings.MODEL_DIR
 MODEL_FILENAME = "visitor_forecast_model.joblib"
-MODEL_PATH = os.path.join(MODEL_DIR, MODEL_FILENAME)
-
-def train_model():
-    print("Starting model training process...")
+MODEL_PATH = os.path.join(MODEL_DIR, MODEL_FILENAME) # Default site; see predictor.model_path_for_site
+
+BENCHMARK_FILENAME = "engine_benchmark.json"
+TRAINING_HISTORY_LIMIT = 2000 # Most recent days used for training
+
+def build_model(engine: Optional[str] = None, **overrides):
+    """Creates an unfitted model for `engine` (default: settings.MODEL_ENGINE)."""
+    return model_engines.build_model(engine or settings.MODEL_ENGINE, **overrides)
+
+def prepare_training_frame(historical_data_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turns raw historical rows into a numeric frame holding TARGET_COLUMN plus MODEL_FEATURES.
+    Rows without a target are dropped.
+    """
+    prepared_df = features.prepare_features_for_model(
+        historical_data_df,
+        target_column=TARGET_COLUMN,
+        is_training=True
+    )
+
+    if prepared_df.empty or TARGET_COLUMN not in prepared_df.columns:
+        return pd.DataFrame()
+
+    prepared_df = prepared_df.dropna(subset=[TARGET_COLUMN])
+
+    # Ensure all model features exist and are numeric
+    for col in features.MODEL_FEATURES:
+        if col not in prepared_df.columns:
+            print(f"Warning: Missing feature '{col}'. Filling with zeros.")
+            prepared_df[col] = 0
+        elif not pd.api.types.is_numeric_dtype(prepared_df[col]):
+            print(f"Warning: Non-numeric feature '{col}'. Attempting conversion.")
+            prepared_df[col] = pd.to_numeric(prepared_df[col], errors='coerce').fillna(0)
+
+    return prepared_df
+
+def load_training_history(site_id: str, db=None) -> pd.DataFrame:
+    return services.get_historical_visitor_data(
+        db=db, limit=TRAINING_HISTORY_LIMIT, columns=TRAINING_COLUMNS, site_id=site_id
+    )
+
+def train_model(
+    site_id: Optional[str] = None,
+    n_jobs: Optional[int] = None,
+    historical_data_df: Optional[pd.DataFrame] = None
+) -> Optional[str]:
+    """
+    Trains and saves the model for one site (default: DEFAULT_SITE_ID). The history is loaded
+    from storage unless passed in as `historical_data_df`.
+    Returns the saved model path, or None if training was aborted.
+    """
+    site_id = site_id or settings.DEFAULT_SITE_ID
+    # Fail loudly on a misconfigured engine instead of inside the training error handler below.
+    model_engines.engine_params(settings.MODEL_ENGINE)
+    # Sampled inside the training process itself, so parallel per-site runs are covered too.
+    with profiling.profile_job(f"train-{site_id}"):
+        return _train_model(site_id, n_jobs, historical_data_df)
+
+def _train_model(site_id: str, n_jobs: Optional[int], historical_data_df: Optional[pd.DataFrame]) -> Optional[str]:
+    model_path = model_path_for_site(site_id)
+    print(f"Starting model training process for site '{site_id}'...")
 
     db = SessionLocal()
     print("Database session created for training.")
 
     try:
-        # 1. Load historical data
-        print("Loading historical visitor data...")
-        historical_data_df = services.get_historical_visitor_data(db=db, limit=2000)
+        # 1. Load historical data (unless the caller already did)
+        if historical_data_df is None:
+            print("Loading historical visitor data...")
+            historical_data_df = load_training_history(site_id, db)
 
         if historical_data_df.empty:
             print("No historical data loaded. Aborting training.")
@@ -34,27 +99,12 @@ def train_model():
 
         # 2. Prepare features
         print("Preparing features for model training...")
-        prepared_df = features.prepare_features_for_model(
-            historical_data_df,
-            target_column=TARGET_COLUMN,
-            is_training=True
-        )
+        prepared_df = prepare_training_frame(historical_data_df)
 
-        if prepared_df.empty or TARGET_COLUMN not in prepared_df.columns:
+        if prepared_df.empty:
             print("Invalid or empty feature set. Aborting.")
             return
 
-        prepared_df.dropna(subset=[TARGET_COLUMN], inplace=True)
-
-        # Ensure all model features exist and are numeric
-        for col in features.MODEL_FEATURES:
-            if col not in prepared_df.columns:
-                print(f"Warning: Missing feature '{col}'. Filling with zeros.")
-                prepared_df[col] = 0
-            elif not pd.api.types.is_numeric_dtype(prepared_df[col]):
-                print(f"Warning: Non-numeric feature '{col}'. Attempting conversion.")
-                prepared_df[col] = pd.to_numeric(prepared_df[col], errors='coerce').fillna(0)
-
         X = prepared_df[features.MODEL_FEATURES]
         y = prepared_df[TARGET_COLUMN]
 
@@ -70,20 +120,39 @@ def train_model():
             print("Training/testing split failed. Aborting.")
             return
 
-        # 4. Train model
-        print("Training RandomForestRegressor...")
-        model = RandomForestRegressor(
-            n_estimators=100,
-            random_state=42,
-            n_jobs=-1,
-            max_depth=10,
-            min_samples_split=5,
-            min_samples_leaf=3
-        )
-        model.fit(X_train, y_train)
+        overrides = {} if n_jobs is None else {'n_jobs': n_jobs}
+        model = None
+
+        # 4. Compare engines on this split, so the configured engine is chosen on measured numbers
+        if settings.MODEL_BENCHMARK_ENABLED:
+            print("Benchmarking model engines...")
+            benchmark, benchmark_models = model_engines.benchmark_engines(
+                X_train, y_train, X_test, y_test, **overrides
+            )
+            # The configured engine was just fitted on the same split with the same parameters.
+            model = benchmark_models.get(settings.MODEL_ENGINE)
+            print(pd.DataFrame(benchmark).to_string(index=False))
+
+            benchmark_path = os.path.join(os.path.dirname(model_path), BENCHMARK_FILENAME)
+            os.makedirs(os.path.dirname(benchmark_path), exist_ok=True)
+            with open(benchmark_path, "w") as f:
+                json.dump({
+                    "site_id": site_id,
+                    "configured_engine": settings.MODEL_ENGINE,
+                    "train_rows": len(X_train),
+                    "test_rows": len(X_test),
+                    "results": benchmark
+                }, f, indent=2)
+            print(f"Engine comparison saved to: {benchmark_path}")
+
+        # 5. Train model (unless the benchmark already did)
+        if model is None:
+            print(f"Training model engine '{settings.MODEL_ENGINE}'...")
+            model = build_model(**overrides)
+            model.fit(X_train, y_train)
         print("Training complete.")
 
-        # 5. Evaluate
+        # 6. Evaluate
         print("Evaluating model...")
         predictions = model.predict(X_test)
         mae = mean_absolute_error(y_test, predictions)
@@ -91,20 +160,19 @@ def train_model():
 
         print(f"Evaluation Results:\n  MAE: {mae:.2f}\n  R²: {r2:.2f}")
 
-        try:
-            importances = model.feature_importances_
-            fi_df = pd.DataFrame({'feature': features.MODEL_FEATURES, 'importance': importances})
+        # Only tree ensembles like the random forest expose impurity-based importances
+        if hasattr(model, 'feature_importances_'):
+            fi_df = pd.DataFrame({'feature': features.MODEL_FEATURES, 'importance': model.feature_importances_})
             fi_df = fi_df.sort_values('importance', ascending=False)
             print("\nTop Feature Importances:")
             print(fi_df.head(10))
-        except Exception as e:
-            print(f"Feature importance extraction failed: {e}")
 
-        # 6. Save model
-        print(f"Saving model to: {MODEL_PATH}")
-        os.makedirs(MODEL_DIR, exist_ok=True)
-        joblib.dump(model, MODEL_PATH)
+        # 7. Save model
+        print(f"Saving model to: {model_path}")
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        joblib.dump(model, model_path)
         print("Model saved successfully.")
+        return model_path
 
     except Exception as e:
         print(f"Exception during training: {e}")
@@ -112,10 +180,47 @@ def train_model():
         db.close()
         print("Database session closed.")
 
+def _init_training_worker(n_jobs: int) -> None:
+    # Forked workers inherit the parent's pooled PostgreSQL connections. Drop them without
+    # closing (they still belong to the parent) so each worker opens its own.
+    engine.dispose(close=False)
+    # n_jobs only reaches the random forest; OpenMP/BLAS pools (e.g. the gradient boosting
+    # engine's) would otherwise use every core in every worker.
+    threadpool_limits(limits=n_jobs)
+
+def train_models_for_sites(site_ids: List[str], max_workers: Optional[int] = None) -> Dict[str, Optional[str]]:
+    """
+    Trains several sites in parallel, one process per site. The CPU budget is split between
+    the processes so each model doesn't spawn a full set of threads of its own.
+    Returns {site_id: saved model path or None}.
+    """
+    if len(site_ids) == 1:
+        return {site_ids[0]: train_model(site_ids[0])}
+
+    model_engines.engine_params(settings.MODEL_ENGINE)
+
+    max_workers = min(len(site_ids), max_workers or settings.TRAINING_MAX_WORKERS)
+    n_jobs = max(1, (os.cpu_count() or 1) // max_workers)
+
+    # A DuckDB connection can't be used after fork, and a fresh one in a spawned worker would hit
+    # the file lock held by this process. In columnar mode the histories are therefore read here
+    # and handed to the workers; with PostgreSQL each worker loads its own.
+    histories: Dict[str, Optional[pd.DataFrame]] = {site_id: None for site_id in site_ids}
+    if settings.use_columnar_store:
+        histories = {site_id: load_training_history(site_id) for site_id in site_ids}
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_training_worker, initargs=(n_jobs,)) as executor:
+        futures = {
+            site_id: executor.submit(train_model, site_id, n_jobs, histories[site_id])
+            for site_id in site_ids
+        }
+        return {site_id: future.result() for site_id, future in futures.items()}
+
 if __name__ == "__main__":
     # Adjust sys.path if run directly
     backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     if backend_root not in sys.path:
         sys.path.insert(0, backend_root)
 
-    train_model()
\ No newline at end of file
+    # Usage: python -m backend.ml_trainer [site_id ...]  (defaults to all configured SITE_IDS)
+    print(train_models_for_sites(sys.argv[1:] or settings.SITE_IDS))
\ No newline at end of file
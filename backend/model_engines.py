@@ -0,0 +1,121 @@
+import io
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Ridge
+from sklearn.metrics import mean_absolute_error
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+# Default hyperparameters per engine. The trainer and the backtest engine both build their
+# models from here, so a change shows up in the backtest configuration hash.
+ENGINE_PARAMS: Dict[str, Dict[str, Any]] = {
+    'random_forest': {
+        'n_estimators': 100,
+        'random_state': 42,
+        'n_jobs': -1,
+        'max_depth': 10,
+        'min_samples_split': 5,
+        'min_samples_leaf': 3,
+    },
+    'hist_gradient_boosting': {
+        'max_iter': 300,
+        'learning_rate': 0.05,
+        'max_leaf_nodes': 31,
+        'min_samples_leaf': 10,
+        'l2_regularization': 0.1,
+        'early_stopping': False,
+        'random_state': 42,
+    },
+    'ridge': {
+        'alpha': 1.0,
+    },
+}
+
+_FACTORIES: Dict[str, Callable[..., Any]] = {
+    'random_forest': lambda **params: RandomForestRegressor(**params),
+    'hist_gradient_boosting': lambda **params: HistGradientBoostingRegressor(**params),
+    # Features have very different scales (temperature vs. year), so the linear baseline is standardised.
+    'ridge': lambda **params: make_pipeline(StandardScaler(), Ridge(**params)),
+}
+
+MODEL_ENGINES = list(ENGINE_PARAMS.keys())
+
+# Inference timing: a typical forecast request scores about a week of days.
+LATENCY_BATCH_ROWS = 7
+LATENCY_REPEATS = 20
+
+
+def engine_params(engine: str) -> Dict[str, Any]:
+    if engine not in ENGINE_PARAMS:
+        raise ValueError(f"Unknown model engine '{engine}'. Expected one of: {', '.join(MODEL_ENGINES)}.")
+    return dict(ENGINE_PARAMS[engine])
+
+
+def build_model(engine: str, **overrides):
+    """
+    Creates an unfitted model for `engine`. Overrides for parameters the engine doesn't have
+    (e.g. n_jobs for the gradient boosting or ridge engines) are ignored.
+    """
+    params = engine_params(engine)
+    params.update({key: value for key, value in overrides.items() if key in params})
+    return _FACTORIES[engine](**params)
+
+
+def artifact_size_bytes(model) -> int:
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.getbuffer().nbytes
+
+
+def _median_latency_ms(model, X: pd.DataFrame) -> float:
+    timings = []
+    for _ in range(LATENCY_REPEATS):
+        started = time.perf_counter()
+        model.predict(X)
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings) * 1000)
+
+
+def benchmark_engines(
+    X_train: pd.DataFrame,
+    y_train: pd.Series,
+    X_test: pd.DataFrame,
+    y_test: pd.Series,
+    engines: Optional[List[str]] = None,
+    **overrides
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Fits every engine on the same split and measures fit time, inference latency (for a
+    forecast-sized batch and for the whole test set), serialized artifact size and test MAE.
+    `overrides` (e.g. an n_jobs budget) are applied as in build_model.
+    Returns one result dict per engine, sorted by MAE, and the fitted models by engine so the
+    caller can keep one instead of fitting it again.
+    """
+    results = []
+    models = {}
+    request_batch = X_test.iloc[:LATENCY_BATCH_ROWS]
+
+    for engine in engines or MODEL_ENGINES:
+        model = build_model(engine, **overrides)
+
+        started = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - started
+        models[engine] = model
+
+        predictions = np.maximum(0, model.predict(X_test))
+        results.append({
+            'engine': engine,
+            'fit_seconds': round(fit_seconds, 4),
+            'request_latency_ms': round(_median_latency_ms(model, request_batch), 3),
+            'test_set_latency_ms': round(_median_latency_ms(model, X_test), 3),
+            'artifact_bytes': artifact_size_bytes(model),
+            'mae': round(float(mean_absolute_error(y_test, predictions)), 3),
+        })
+
+    return sorted(results, key=lambda r: r['mae']), models
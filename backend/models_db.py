@@ -1,8 +1,11 @@
-from sqlalchemy import Column, Integer, String, Date, Boolean, Float, Sequence
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, Float, Sequence, UniqueConstraint
+from datetime import datetime
 from backend.database import Base # Import Base from database.py
+from backend.core.config import settings
 
 class VisitorDataDb(Base):
     __tablename__ = "visitor_data"
+    __table_args__ = (UniqueConstraint("site_id", "date", name="uq_visitor_data_site_date"),)
 
     # Define a sequence for the id if not using auto-incrementing type directly supported by DB,
     # or rely on DB's auto-increment if `Integer, primary_key=True` is enough (common for Postgres).
@@ -11,7 +14,8 @@ class VisitorDataDb(Base):
     # id_seq = Sequence(f'{__tablename__}_id_seq') # Example if explicit sequence desired
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True) # autoincrement=True is default for Integer PK
-    date = Column(Date, nullable=False, index=True, unique=True) # Assuming one record per date
+    site_id = Column(String(50), nullable=False, index=True, default=settings.DEFAULT_SITE_ID, server_default=settings.DEFAULT_SITE_ID)
+    date = Column(Date, nullable=False, index=True) # One record per site and date
     visitor_count = Column(Integer, nullable=False)
 
     # Derived or external calendar features (can be pre-calculated or joined)
@@ -41,16 +45,68 @@ class VisitorDataDb(Base):
     def __repr__(self):
         return f"<VisitorDataDb(id={self.id}, date='{self.date}', visitors='{self.visitor_count}')>"
 
-# If you had other models, they would be defined here as well.
-# For example, if live visitor counts were stored in a separate table:
-# class LiveVisitorCountDb(Base):
-#     __tablename__ = "live_visitor_counts"
-#     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-#     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
-#     visitor_count = Column(Integer, nullable=False)
-#
-#     def __repr__(self):
-#         return f"<LiveVisitorCountDb(id={self.id}, time='{self.timestamp}', count='{self.visitor_count}')>"
+class VisitorDataVersionDb(Base):
+    __tablename__ = "visitor_data_versions"
+
+    # Bumped by every ingest into visitor_data, so readers can tell a site's rows changed
+    # (including in-place corrections) without scanning them.
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    site_id = Column(String(50), nullable=False, unique=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<VisitorDataVersionDb(site_id='{self.site_id}', version='{self.version}')>"
+
+class BacktestCutoffDb(Base):
+    __tablename__ = "backtest_cutoffs"
+    __table_args__ = (UniqueConstraint("site_id", "cutoff_date", name="uq_backtest_cutoffs_site_cutoff"),)
+
+    # One row per simulated retraining date. The hashes let a rerun skip cutoffs whose
+    # training data and model configuration are unchanged.
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    site_id = Column(String(50), nullable=False, index=True, default=settings.DEFAULT_SITE_ID, server_default=settings.DEFAULT_SITE_ID)
+    cutoff_date = Column(Date, nullable=False, index=True) # Model trained on days strictly before this date
+    horizon_days = Column(Integer, nullable=False)
+    config_hash = Column(String(64), nullable=False)
+    data_hash = Column(String(64), nullable=False)
+    training_rows = Column(Integer, nullable=False)
+    evaluated_days = Column(Integer, nullable=False)
+    mae = Column(Float, nullable=True)
+    rmse = Column(Float, nullable=True)
+    mape = Column(Float, nullable=True) # Mean absolute percentage error over days with visitors > 0
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<BacktestCutoffDb(cutoff='{self.cutoff_date}', mae='{self.mae}')>"
+
+class BacktestResultDb(Base):
+    __tablename__ = "backtest_results"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    site_id = Column(String(50), nullable=False, index=True, default=settings.DEFAULT_SITE_ID, server_default=settings.DEFAULT_SITE_ID)
+    cutoff_date = Column(Date, nullable=False, index=True)
+    date = Column(Date, nullable=False, index=True)
+    days_ahead = Column(Integer, nullable=False) # 1 = first day after the cutoff
+    predicted_visitors = Column(Integer, nullable=False)
+    actual_visitors = Column(Integer, nullable=False)
+    error = Column(Integer, nullable=False) # predicted - actual
+    abs_error = Column(Integer, nullable=False)
+    pct_error = Column(Float, nullable=True) # abs_error / actual, NULL when actual is 0
+
+    def __repr__(self):
+        return f"<BacktestResultDb(date='{self.date}', predicted='{self.predicted_visitors}', actual='{self.actual_visitors}')>"
+
+class LiveVisitorCountDb(Base):
+    __tablename__ = "live_visitor_counts"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    site_id = Column(String(50), nullable=False, index=True, default=settings.DEFAULT_SITE_ID, server_default=settings.DEFAULT_SITE_ID)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    visitor_count = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<LiveVisitorCountDb(id={self.id}, time='{self.timestamp}', count='{self.visitor_count}')>"
 
 # After defining all models that use Base, you might want to ensure they are all imported
 # where create_db_and_tables is called in database.py.
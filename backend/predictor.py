@@ -1,51 +1,225 @@
 import joblib
 import pandas as pd
 import os
+import re
+import threading
 import numpy as np
-from typing import List, Dict, Any
+from collections import OrderedDict
+from typing import List, Dict, Any, Callable, NamedTuple, Optional, Sequence, Tuple
 
+from backend.core.config import settings
 from backend.features import prepare_features_for_model, MODEL_FEATURES
 
-MODEL_DIR = os.path.join(os.path.dirname(__file__), "models")
+MODEL_DIR = settings.MODEL_DIR
 MODEL_FILENAME = "visitor_forecast_model.joblib"
 MODEL_PATH = os.path.join(MODEL_DIR, MODEL_FILENAME)
 
-# Global variable to hold the loaded model
-loaded_model = None
+SITE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,50}$")
 
-def load_trained_model():
-    """Loads the trained model from disk."""
-    global loaded_model
+def is_valid_site_id(site_id: str) -> bool:
+    return bool(SITE_ID_PATTERN.match(site_id or ""))
 
-    if not os.path.exists(MODEL_PATH):
-        print(f"Error: Model file not found at {MODEL_PATH}. Please train it first.")
-        return None
+def model_path_for_site(site_id: str) -> str:
+    """
+    Location of a site's model artifact. The default site keeps the original single-model
+    path so existing deployments don't need to retrain.
+    """
+    if not is_valid_site_id(site_id):
+        raise ValueError(f"Invalid site_id '{site_id}'.")
+    if site_id == settings.DEFAULT_SITE_ID:
+        return MODEL_PATH
+    return os.path.join(MODEL_DIR, site_id, MODEL_FILENAME)
 
-    try:
-        loaded_model = joblib.load(MODEL_PATH)
-        print(f"Model loaded successfully from {MODEL_PATH}")
-        return loaded_model
-    except Exception as e:
-        print(f"Error loading model: {e}")
-        loaded_model = None
+def build_leaf_table(model) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Concatenates the node values of all trees in a fitted forest into one array, together
+    with each tree's offset into it. Returns None for models that are not tree ensembles.
+    """
+    estimators = getattr(model, "estimators_", None)
+    if estimators is None or len(estimators) == 0 or not all(hasattr(e, "tree_") for e in estimators):
         return None
 
+    node_values = [e.tree_.value[:, 0, 0] for e in estimators]
+    offsets = np.cumsum([0] + [len(v) for v in node_values[:-1]]).astype(np.intp)
+    return np.concatenate(node_values).astype(np.float64), offsets
+
+def predict_per_tree(model, leaf_table: Tuple[np.ndarray, np.ndarray], X) -> np.ndarray:
+    """
+    Returns a (rows x trees) matrix of individual tree predictions. A single `apply` call
+    finds every row's leaf in every tree; the values are then gathered with one fancy index.
+    """
+    leaf_values, offsets = leaf_table
+    leaves = model.apply(X)
+    return leaf_values[leaves + offsets]
+
+
+class QuantilesNotSupportedError(ValueError):
+    """Raised when prediction intervals are requested from a model without per-tree outputs."""
+
+
+class LoadedModel(NamedTuple):
+    site_id: str
+    model: Any
+    # Flattened leaf values of every tree, used for per-tree (interval) predictions
+    leaf_table: Optional[Tuple[np.ndarray, np.ndarray]]
+    size_bytes: int  # Approximate memory footprint, used for eviction
+
+
+class ModelPool:
+    """
+    Bounded LRU pool of per-site models. Models are loaded from disk on first use and the
+    least recently used ones are evicted once the pool exceeds `max_models` or its estimated
+    memory use exceeds `max_memory_bytes`. The most recently used model is never evicted.
+    Callbacks registered with `add_load_listener` run after every load from disk.
+    """
+
+    def __init__(self, max_models: int, max_memory_bytes: int):
+        self.max_models = max(1, max_models)
+        self.max_memory_bytes = max_memory_bytes
+        self._entries: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._load_listeners: List[Callable[[LoadedModel], None]] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def add_load_listener(self, listener: Callable[[LoadedModel], None]) -> None:
+        self._load_listeners.append(listener)
+
+    def _notify_loaded(self, entry: LoadedModel) -> None:
+        for listener in self._load_listeners:
+            try:
+                listener(entry)
+            except Exception as e:
+                print(f"Model load listener failed for site '{entry.site_id}': {e}")
+
+    def _load_lock(self, site_id: str) -> threading.Lock:
+        with self._lock:
+            return self._load_locks.setdefault(site_id, threading.Lock())
+
+    def _load_from_disk(self, site_id: str) -> Optional[LoadedModel]:
+        path = model_path_for_site(site_id)
+        if not os.path.exists(path):
+            print(f"Error: Model file not found at {path}. Please train it first.")
+            return None
+
+        try:
+            model = joblib.load(path)
+        except Exception as e:
+            print(f"Error loading model for site '{site_id}': {e}")
+            return None
+
+        leaf_table = build_leaf_table(model)
+        # The unpickled model is roughly as large as its artifact; add the leaf table on top.
+        size_bytes = os.path.getsize(path)
+        if leaf_table is not None:
+            size_bytes += leaf_table[0].nbytes + leaf_table[1].nbytes
+
+        print(f"Model for site '{site_id}' loaded successfully from {path}")
+        return LoadedModel(site_id=site_id, model=model, leaf_table=leaf_table, size_bytes=size_bytes)
 
-def predict_visitor_counts(future_weather_data_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Predicts visitor counts based on future weather forecast data."""
-    global loaded_model
+    def _evict_locked(self) -> None:
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_models or self.memory_bytes_locked() > self.max_memory_bytes
+        ):
+            evicted_site, _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            print(f"Evicted model for site '{evicted_site}' from the model pool.")
 
-    if loaded_model is None:
-        print("Model not loaded. Attempting to load...")
-        load_trained_model()
+    def memory_bytes_locked(self) -> int:
+        return sum(entry.size_bytes for entry in self._entries.values())
 
-    if loaded_model is None:
-        print("Model still not loaded. Aborting prediction.")
+    def get(self, site_id: str) -> Optional[LoadedModel]:
+        """Returns the site's model, loading it on first use."""
+        with self._lock:
+            entry = self._entries.get(site_id)
+            if entry is not None:
+                self._entries.move_to_end(site_id)
+                self.hits += 1
+                return entry
+
+        # Load outside the pool lock so other sites stay servable; one loader per site.
+        with self._load_lock(site_id):
+            with self._lock:
+                entry = self._entries.get(site_id)
+                if entry is not None:
+                    self._entries.move_to_end(site_id)
+                    self.hits += 1
+                    return entry
+                self.misses += 1
+
+            entry = self._load_from_disk(site_id)
+            if entry is not None:
+                with self._lock:
+                    self._entries[site_id] = entry
+                    self._evict_locked()
+                self._notify_loaded(entry)
+            return entry
+
+    def reload(self, site_id: str) -> Optional[LoadedModel]:
+        """Drops a cached model (e.g. after retraining) and loads it again from disk."""
+        self.discard(site_id)
+        return self.get(site_id)
+
+    def discard(self, site_id: str) -> None:
+        with self._lock:
+            self._entries.pop(site_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "loaded_sites": list(self._entries.keys()),
+                "models": len(self._entries),
+                "max_models": self.max_models,
+                "memory_bytes": self.memory_bytes_locked(),
+                "max_memory_bytes": self.max_memory_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+model_pool = ModelPool(
+    max_models=settings.MODEL_POOL_MAX_MODELS,
+    max_memory_bytes=settings.MODEL_POOL_MAX_MEMORY_MB * 1024 * 1024
+)
+
+def load_trained_model(site_id: Optional[str] = None):
+    """(Re)loads a site's trained model from disk into the model pool."""
+    entry = model_pool.reload(site_id or settings.DEFAULT_SITE_ID)
+    return entry.model if entry is not None else None
+
+
+def predict_visitor_counts(
+    future_weather_data_list: List[Dict[str, Any]],
+    quantiles: Optional[Sequence[float]] = None,
+    site_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Predicts visitor counts for one site (default: DEFAULT_SITE_ID) based on future weather
+    forecast data.
+
+    If `quantiles` (percentiles in 0-100) are given and the model is a tree ensemble, each result
+    also carries a "quantiles" dict such as {"p10": 80, "p50": 95, "p90": 120}, taken across the
+    per-tree predictions. Requesting quantiles from any other model raises QuantilesNotSupportedError.
+    """
+    site_id = site_id or settings.DEFAULT_SITE_ID
+    loaded = model_pool.get(site_id)
+
+    if loaded is None:
+        print(f"Model for site '{site_id}' not loaded. Aborting prediction.")
         return [
             {"date": item.get("date", "unknown_date"), "predicted_visitors": -1, "error": "Model not loaded"}
             for item in future_weather_data_list
         ]
 
+    if quantiles and loaded.leaf_table is None:
+        raise QuantilesNotSupportedError(
+            f"Prediction intervals need a tree-ensemble model; site '{site_id}' uses "
+            f"{type(loaded.model).__name__}."
+        )
+
     if not future_weather_data_list:
         print("No weather data provided.")
         return []
@@ -86,8 +260,16 @@ def predict_visitor_counts(future_weather_data_list: List[Dict[str, Any]]) -> Li
         ]
 
     # Prediction
+    quantile_values = None
     try:
-        raw_predictions = loaded_model.predict(X_pred)
+        if quantiles:
+            # The forest's point prediction is the mean over its trees, so one per-tree pass
+            # yields both the point estimate and the interval.
+            tree_predictions = predict_per_tree(loaded.model, loaded.leaf_table, X_pred)
+            raw_predictions = tree_predictions.mean(axis=1)
+            quantile_values = np.maximum(0, np.percentile(tree_predictions, quantiles, axis=1)).astype(int)
+        else:
+            raw_predictions = loaded.model.predict(X_pred)
     except Exception as e:
         print(f"Prediction error: {e}")
         return [
@@ -97,18 +279,23 @@ def predict_visitor_counts(future_weather_data_list: List[Dict[str, Any]]) -> Li
 
     cleaned_predictions = np.maximum(0, raw_predictions).astype(int)
 
-    return [
+    results = [
         {"date": str(date_val), "predicted_visitors": int(pred)}
         for date_val, pred in zip(original_dates, cleaned_predictions)
     ]
 
+    if quantile_values is not None:
+        labels = [f"p{q:g}" for q in quantiles]
+        for i, result in enumerate(results):
+            result["quantiles"] = {label: int(quantile_values[j, i]) for j, label in enumerate(labels)}
+
+    return results
+
 
 if __name__ == "__main__":
     print("Testing predictor...")
 
-    load_trained_model()
-
-    if loaded_model:
+    if load_trained_model() is not None:
         dummy_data = [
             {
                 'date': '2023-11-01', 'temp': 15.0, 'feels_like': 14.0,
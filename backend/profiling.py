@@ -0,0 +1,175 @@
+import glob
+import hmac
+import os
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Iterator, List, Optional
+from urllib.parse import parse_qs
+
+from backend.core.config import settings
+
+# On-demand profiling built on pyinstrument's sampling profiler. Profiles are written in
+# speedscope format (https://www.speedscope.app), which flamegraph tools can open.
+#
+# Nothing here runs unless PROFILING_ENABLED / RETRAIN_PROFILING_ENABLED are set: the request
+# middleware is only installed when enabled, and profile_job() is a no-op context otherwise.
+
+PROFILE_HEADER = "x-profile-token"
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_RETURN_PARAM = "profile_return"
+PROFILE_FILE_HEADER = b"x-profile-file"
+PROFILE_SUFFIX = ".speedscope.json"
+
+
+def is_available() -> bool:
+    try:
+        import pyinstrument  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def is_authorized(token: Optional[str]) -> bool:
+    # An empty configured token never matches, so profiling can't be enabled without one.
+    # Compared as bytes: compare_digest rejects str arguments with non-ASCII characters.
+    if not settings.PROFILING_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), settings.PROFILING_TOKEN.encode("utf-8"))
+
+
+def _render_speedscope(profiler) -> str:
+    from pyinstrument.renderers import SpeedscopeRenderer
+    return profiler.output(renderer=SpeedscopeRenderer())
+
+
+def _prune(prefix: str) -> None:
+    """Keeps only the newest PROFILE_MAX_FILES profiles with this prefix."""
+    files = sorted(
+        glob.glob(os.path.join(settings.PROFILE_DIR, f"{prefix}-*{PROFILE_SUFFIX}")),
+        key=os.path.getmtime
+    )
+    for stale in files[:-settings.PROFILE_MAX_FILES] if settings.PROFILE_MAX_FILES > 0 else []:
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+
+
+def _new_profile_name(prefix: str) -> str:
+    return f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}{PROFILE_SUFFIX}"
+
+
+def save_profile(profiler, name: str, prefix: str) -> str:
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILE_DIR, name)
+    with open(path, "w") as f:
+        f.write(_render_speedscope(profiler))
+    _prune(prefix)
+    return path
+
+
+def profile_path(name: str) -> Optional[str]:
+    """Resolves a stored profile by file name, refusing anything outside PROFILE_DIR."""
+    if os.path.basename(name) != name or not name.endswith(PROFILE_SUFFIX):
+        return None
+    path = os.path.join(settings.PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def list_profiles() -> List[str]:
+    files = sorted(glob.glob(os.path.join(settings.PROFILE_DIR, f"*{PROFILE_SUFFIX}")), key=os.path.getmtime)
+    return [os.path.basename(path) for path in reversed(files)]
+
+
+class RequestProfilerMiddleware:
+    """
+    ASGI middleware that profiles a single request when it carries a valid token, either in
+    the X-Profile-Token header or the `profile` query parameter. The profile is stored in
+    PROFILE_DIR and its file name returned in the X-Profile-File response header; with
+    `profile_return=1` the speedscope JSON replaces the response body instead.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _request_options(scope):
+        token = None
+        for key, value in scope.get("headers", []):
+            if key == PROFILE_HEADER.encode():
+                token = value.decode("latin-1")
+                break
+
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        token = token or (query.get(PROFILE_QUERY_PARAM) or [None])[0]
+        return_profile = (query.get(PROFILE_RETURN_PARAM) or ["0"])[0].lower() in ("1", "true", "yes")
+        return token, return_profile
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token, return_profile = self._request_options(scope)
+        if token is None or not is_authorized(token):
+            await self.app(scope, receive, send)
+            return
+
+        from pyinstrument import Profiler
+
+        name = _new_profile_name("request")
+
+        async def send_with_profile_header(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (PROFILE_FILE_HEADER, name.encode())]}
+            await send(message)
+
+        async def discard(message):
+            pass
+
+        profiler = Profiler(interval=settings.PROFILE_INTERVAL_MS / 1000, async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard if return_profile else send_with_profile_header)
+        finally:
+            profiler.stop()
+            save_profile(profiler, name, "request")
+
+        if return_profile:
+            with open(os.path.join(settings.PROFILE_DIR, name), "rb") as f:
+                body = f.read()
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (PROFILE_FILE_HEADER, name.encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+
+
+@contextmanager
+def _profiled_job(prefix: str) -> Iterator[None]:
+    from pyinstrument import Profiler
+
+    profiler = Profiler(interval=settings.RETRAIN_PROFILE_INTERVAL_MS / 1000)
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        path = save_profile(profiler, _new_profile_name(prefix), prefix)
+        print(f"Profile for '{prefix}' written to {path}")
+
+
+def profile_job(prefix: str):
+    """
+    Low-overhead sampling profile around a background job (e.g. retraining). Only the newest
+    PROFILE_MAX_FILES profiles per prefix are kept. A no-op unless RETRAIN_PROFILING_ENABLED.
+    """
+    if not settings.RETRAIN_PROFILING_ENABLED or not is_available():
+        return nullcontext()
+    return _profiled_job(prefix)
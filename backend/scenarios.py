@@ -0,0 +1,155 @@
+import io
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backend.features import MODEL_FEATURES, WEATHER_FEATURES, build_feature_matrix
+from backend.predictor import model_pool
+
+# Bulk "what-if" scoring: a columnar batch of dates + hypothetical weather goes in, the same
+# columns plus predicted_visitors come out, in the format the request used.
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+NPY_MEDIA_TYPE = "application/x-npy"
+SUPPORTED_MEDIA_TYPES = (ARROW_STREAM_MEDIA_TYPE, NPY_MEDIA_TYPE)
+
+# Optional column echoed back unchanged so callers can join results to their scenarios.
+SCENARIO_ID_COLUMN = "scenario_id"
+
+
+class ScenarioInputError(ValueError):
+    """Raised when a scenario batch can't be decoded or lacks required columns."""
+
+
+class ModelNotAvailableError(Exception):
+    """Raised when the site has no trained model to score with."""
+
+
+def _read_arrow(body: bytes) -> Tuple[np.ndarray, Dict[str, np.ndarray], Optional[np.ndarray]]:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(body)).read_all().combine_chunks()
+    except pa.ArrowInvalid as e:
+        raise ScenarioInputError(f"Invalid Arrow IPC stream: {e}")
+
+    if "date" not in table.column_names:
+        raise ScenarioInputError("Scenario batch must contain a 'date' column.")
+
+    dates = table.column("date")
+    try:
+        if pa.types.is_string(dates.type) or pa.types.is_large_string(dates.type):
+            dates = pc.strptime(dates, format="%Y-%m-%d", unit="s")
+        # Timestamps are truncated to their day; other types must cast to a date losslessly.
+        dates = dates.cast(pa.date32(), safe=not pa.types.is_timestamp(dates.type))
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError) as e:
+        raise ScenarioInputError(f"Column 'date' must hold dates or YYYY-MM-DD strings: {e}")
+    dates = dates.to_numpy().astype("datetime64[D]")
+
+    weather = {}
+    for name in WEATHER_FEATURES:
+        if name in table.column_names:
+            column = table.column(name)
+            if not (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)):
+                raise ScenarioInputError(f"Column '{name}' must be numeric, got {column.type}.")
+            if column.null_count:
+                column = pc.fill_null(column, 0)
+            # Single-chunk, null-free numeric columns are exposed without copying.
+            weather[name] = column.to_numpy()
+
+    scenario_ids = None
+    if SCENARIO_ID_COLUMN in table.column_names:
+        scenario_ids = table.column(SCENARIO_ID_COLUMN).to_numpy(zero_copy_only=False)
+
+    return dates, weather, scenario_ids
+
+
+def _read_npy(body: bytes) -> Tuple[np.ndarray, Dict[str, np.ndarray], Optional[np.ndarray]]:
+    try:
+        batch = np.load(io.BytesIO(body), allow_pickle=False)
+    except ValueError as e:
+        raise ScenarioInputError(f"Invalid .npy payload: {e}")
+
+    if batch.dtype.names is None or "date" not in batch.dtype.names:
+        raise ScenarioInputError("NPY batch must be a structured array with a 'date' field.")
+
+    dates = batch["date"]
+    if not np.issubdtype(dates.dtype, np.datetime64):
+        try:
+            dates = dates.astype("datetime64[D]")
+        except (ValueError, TypeError) as e:
+            raise ScenarioInputError(f"Field 'date' must hold dates or YYYY-MM-DD strings: {e}")
+
+    # Field access on a structured array returns strided views, not copies.
+    weather = {name: batch[name] for name in WEATHER_FEATURES if name in batch.dtype.names}
+    for name, values in weather.items():
+        if not (np.issubdtype(values.dtype, np.integer) or np.issubdtype(values.dtype, np.floating)):
+            raise ScenarioInputError(f"Field '{name}' must be numeric, got {values.dtype}.")
+    scenario_ids = batch[SCENARIO_ID_COLUMN] if SCENARIO_ID_COLUMN in batch.dtype.names else None
+    return dates, weather, scenario_ids
+
+
+def _write_arrow(dates: np.ndarray, predictions: np.ndarray, scenario_ids: Optional[np.ndarray]) -> bytes:
+    import pyarrow as pa
+
+    columns = {}
+    if scenario_ids is not None:
+        columns[SCENARIO_ID_COLUMN] = pa.array(scenario_ids)
+    columns["date"] = pa.array(dates.astype("datetime64[D]"), type=pa.date32())
+    columns["predicted_visitors"] = pa.array(predictions)
+    table = pa.table(columns)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _write_npy(dates: np.ndarray, predictions: np.ndarray, scenario_ids: Optional[np.ndarray]) -> bytes:
+    fields = [("date", "datetime64[D]"), ("predicted_visitors", np.int32)]
+    if scenario_ids is not None:
+        fields.insert(0, (SCENARIO_ID_COLUMN, scenario_ids.dtype))
+
+    result = np.empty(len(dates), dtype=fields)
+    result["date"] = dates
+    result["predicted_visitors"] = predictions
+    if scenario_ids is not None:
+        result[SCENARIO_ID_COLUMN] = scenario_ids
+
+    buffer = io.BytesIO()
+    np.save(buffer, result, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def score_scenarios(body: bytes, media_type: str, site_id: str, max_rows: int) -> bytes:
+    """
+    Decodes a scenario batch, scores it with the site's model in one vectorized call and
+    encodes the predictions in the same format.
+    """
+    if media_type == ARROW_STREAM_MEDIA_TYPE:
+        dates, weather, scenario_ids = _read_arrow(body)
+    elif media_type == NPY_MEDIA_TYPE:
+        dates, weather, scenario_ids = _read_npy(body)
+    else:
+        raise ScenarioInputError(f"Unsupported content type '{media_type}'.")
+
+    if len(dates) == 0:
+        raise ScenarioInputError("Scenario batch is empty.")
+    if len(dates) > max_rows:
+        raise ScenarioInputError(f"Scenario batch has {len(dates)} rows; the limit is {max_rows}.")
+    if np.isnat(dates).any():
+        raise ScenarioInputError("Scenario batch contains missing dates.")
+
+    loaded = model_pool.get(site_id)
+    if loaded is None:
+        raise ModelNotAvailableError(f"No trained model available for site '{site_id}'.")
+
+    X = build_feature_matrix(dates, weather)
+    # Wrap without copying so the model sees the feature names it was fitted with.
+    raw_predictions = loaded.model.predict(pd.DataFrame(X, columns=MODEL_FEATURES, copy=False))
+    predictions = np.maximum(0, raw_predictions).astype(np.int32)
+
+    if media_type == ARROW_STREAM_MEDIA_TYPE:
+        return _write_arrow(dates, predictions, scenario_ids)
+    return _write_npy(dates, predictions, scenario_ids)
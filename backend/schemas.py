@@ -5,8 +5,8 @@
 # Implementation details will be added in Step 6.
 
 from pydantic import BaseModel
-from typing import List, Optional
-from datetime import date
+from typing import Dict, List, Optional
+from datetime import date, datetime
 
 class WeatherForecastInput(BaseModel):
     start_date: date
@@ -23,6 +23,104 @@ class VisitorForecastOutput(BaseModel):
     date: date
     predicted_visitors: int
     weather_forecast: WeatherData # Or a more detailed weather schema
+    quantiles: Optional[Dict[str, int]] = None # e.g. {"p10": 80, "p50": 95, "p90": 120}, only when requested
 
 class VisitorForecastResponse(BaseModel):
     forecasts: List[VisitorForecastOutput]
+
+# --- Historical analytics ---
+
+class AggregateStats(BaseModel):
+    days: int
+    total_visitors: int
+    avg_visitors: float
+    min_visitors: int
+    max_visitors: int
+    avg_temp: Optional[float] = None
+
+class PeriodAggregate(AggregateStats):
+    period_start: date
+
+class PeriodAggregateResponse(BaseModel):
+    period: str
+    aggregates: List[PeriodAggregate]
+
+class WeekdayAggregate(AggregateStats):
+    day_of_week: int  # Monday=0, Sunday=6
+
+class WeekdayAggregateResponse(BaseModel):
+    aggregates: List[WeekdayAggregate]
+
+class TemperatureBucket(AggregateStats):
+    temp_from: float
+    temp_to: float
+
+class TemperatureBucketResponse(BaseModel):
+    bucket_width: float
+    buckets: List[TemperatureBucket]
+
+class VisitorDataRecord(BaseModel):
+    site_id: Optional[str] = None
+    date: date
+    visitor_count: int
+    day_of_week: Optional[str] = None
+    is_holiday: Optional[bool] = None
+    is_weekend: Optional[bool] = None
+    is_school_break: Optional[bool] = None
+    special_event: Optional[str] = None
+    temp: Optional[float] = None
+    temp_min: Optional[float] = None
+    temp_max: Optional[float] = None
+    feels_like: Optional[float] = None
+    humidity: Optional[float] = None
+    pressure: Optional[float] = None
+    wind_speed: Optional[float] = None
+    pop: Optional[float] = None
+    weather_main: Optional[str] = None
+    weather_description: Optional[str] = None
+    weather_icon: Optional[str] = None
+    clouds: Optional[int] = None
+    rain_3h: Optional[float] = None
+
+class VisitorDataPage(BaseModel):
+    items: List[VisitorDataRecord]
+    next_cursor: Optional[date] = None  # Pass as `after` to fetch the next page
+
+# --- Backtesting ---
+
+class BacktestRunResponse(BaseModel):
+    cutoffs_total: int
+    cutoffs_run: int
+    cutoffs_skipped: int
+
+class BacktestResult(BaseModel):
+    cutoff_date: date
+    date: date
+    days_ahead: int
+    predicted_visitors: int
+    actual_visitors: int
+    error: int
+    abs_error: int
+    pct_error: Optional[float] = None
+
+class BacktestResultsResponse(BaseModel):
+    results: List[BacktestResult]
+
+# --- Sensitivity surfaces ---
+
+class SensitivityPoint(BaseModel):
+    site_id: str
+    month: int
+    weekday: int  # Monday=0
+    temp: float
+    pop: float
+    expected_visitors: float
+
+class SensitivitySurfaceResponse(BaseModel):
+    site_id: str
+    month: int
+    weekday: int
+    temps: List[float]
+    pops: List[float]
+    values: List[List[float]]  # values[i][j] = expected visitors at temps[i], pops[j]
+    computed_at: datetime
@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Any, Dict, NamedTuple, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from backend.core.config import settings
+from backend.features import MODEL_FEATURES, build_feature_matrix
+from backend.predictor import LoadedModel, model_path_for_site, model_pool
+
+# Precomputed sensitivity surfaces: expected visitors over a dense temperature x pop grid for
+# every month and weekday, evaluated in one batch after each model load. Dashboard queries are
+# then answered by bilinear interpolation into the stored array, without touching the model.
+
+TEMP_GRID = np.arange(-5.0, 41.0, 1.0)           # °C
+POP_GRID = np.round(np.arange(0.0, 1.01, 0.1), 2)  # probability of precipitation
+MONTHS = 12
+WEEKDAYS = 7                                     # Monday=0, as in features.day_of_week
+SURFACE_SHAPE = (MONTHS, WEEKDAYS, len(TEMP_GRID), len(POP_GRID))
+
+# The forecast's daily temperature is a single midday reading, so the temperature-like
+# features follow the grid temperature; the remaining weather is held at typical values.
+TEMPERATURE_FEATURES = ['temp', 'feels_like', 'temp_min', 'temp_max']
+BASELINE_WEATHER = {'humidity': 65.0, 'wind_speed': 3.5}
+
+SURFACE_FILENAME = "sensitivity_surface.npy"
+
+
+class SensitivitySurface(NamedTuple):
+    site_id: str
+    values: np.ndarray      # float32, SURFACE_SHAPE
+    model_mtime: float      # mtime of the model artifact the surface was computed from
+    computed_at: float
+
+
+def surface_path_for_site(site_id: str) -> str:
+    return os.path.join(os.path.dirname(model_path_for_site(site_id)), SURFACE_FILENAME)
+
+
+def representative_dates(year: int) -> np.ndarray:
+    """(MONTHS, WEEKDAYS) array holding, per month, the first date from the 15th on with each weekday."""
+    dates = np.empty((MONTHS, WEEKDAYS), dtype='datetime64[D]')
+    for month in range(1, MONTHS + 1):
+        mid_month = date(year, month, 15)
+        for weekday in range(WEEKDAYS):
+            dates[month - 1, weekday] = mid_month + timedelta(days=(weekday - mid_month.weekday()) % 7)
+    return dates
+
+
+def compute_surface(model, year: Optional[int] = None) -> np.ndarray:
+    """Evaluates `model` over the full grid in a single predict call; returns a SURFACE_SHAPE array."""
+    year = year or date.today().year
+    cells_per_day = len(TEMP_GRID) * len(POP_GRID)
+    n_days = MONTHS * WEEKDAYS
+
+    # Row order is (month, weekday, temp, pop) so the predictions reshape straight into the surface.
+    dates = np.repeat(representative_dates(year).ravel(), cells_per_day)
+    temps = np.tile(np.repeat(TEMP_GRID, len(POP_GRID)), n_days)
+    weather = {feature: temps for feature in TEMPERATURE_FEATURES}
+    weather['pop'] = np.tile(POP_GRID, n_days * len(TEMP_GRID))
+    for feature, value in BASELINE_WEATHER.items():
+        weather[feature] = np.full(len(dates), value)
+
+    X = build_feature_matrix(dates, weather)
+    predictions = model.predict(pd.DataFrame(X, columns=MODEL_FEATURES, copy=False))
+    return np.maximum(0, predictions).astype(np.float32).reshape(SURFACE_SHAPE)
+
+
+class SurfaceStore:
+    """
+    Holds the current surface per site. Surfaces are recomputed on a single background thread
+    whenever a model is loaded whose artifact is newer than the stored surface, and persisted
+    next to the model so other workers and restarts can reuse them. `on_model_loaded` can also
+    be called again to retry a site whose computation failed; one refresh per site is queued at a time.
+    """
+
+    def __init__(self):
+        self._surfaces: Dict[str, SensitivitySurface] = {}
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sensitivity")
+
+    def get(self, site_id: str) -> Optional[SensitivitySurface]:
+        with self._lock:
+            return self._surfaces.get(site_id)
+
+    def on_model_loaded(self, entry: LoadedModel) -> None:
+        with self._lock:
+            if entry.site_id in self._pending:
+                return
+            self._pending.add(entry.site_id)
+        self._executor.submit(self._refresh, entry)
+
+    def _refresh(self, entry: LoadedModel) -> None:
+        try:
+            model_mtime = os.path.getmtime(model_path_for_site(entry.site_id))
+            current = self.get(entry.site_id)
+            if current is not None and current.model_mtime >= model_mtime:
+                return
+
+            surface = self._load_from_disk(entry.site_id, model_mtime)
+            if surface is None:
+                started = time.perf_counter()
+                surface = SensitivitySurface(
+                    site_id=entry.site_id,
+                    values=compute_surface(entry.model),
+                    model_mtime=model_mtime,
+                    computed_at=time.time()
+                )
+                self._save(surface)
+                print(f"Sensitivity surface for site '{entry.site_id}' computed in "
+                      f"{time.perf_counter() - started:.2f}s.")
+
+            with self._lock:
+                self._surfaces[entry.site_id] = surface
+        except Exception as e:
+            print(f"Error computing sensitivity surface for site '{entry.site_id}': {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(entry.site_id)
+
+    @staticmethod
+    def _load_from_disk(site_id: str, model_mtime: float) -> Optional[SensitivitySurface]:
+        path = surface_path_for_site(site_id)
+        if not os.path.exists(path) or os.path.getmtime(path) < model_mtime:
+            return None
+        values = np.load(path, allow_pickle=False)
+        if values.shape != SURFACE_SHAPE:
+            return None  # Grid definition changed since the file was written
+        return SensitivitySurface(site_id, values, model_mtime, os.path.getmtime(path))
+
+    @staticmethod
+    def _save(surface: SensitivitySurface) -> None:
+        path = surface_path_for_site(surface.site_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename, so concurrent workers never read a partial file.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, surface.values, allow_pickle=False)
+        os.replace(tmp_path, path)
+
+
+surface_store = SurfaceStore()
+if settings.SENSITIVITY_ENABLED:
+    model_pool.add_load_listener(surface_store.on_model_loaded)
+
+
+def _grid_position(grid: np.ndarray, value: float):
+    """Lower grid index and interpolation weight for `value`, clamped to the grid's range."""
+    step = float(grid[1] - grid[0])
+    position = min(max((value - float(grid[0])) / step, 0.0), len(grid) - 1.0)
+    lower = min(int(position), len(grid) - 2)
+    return lower, position - lower
+
+
+def lookup(surface: SensitivitySurface, month: int, weekday: int, temp: float, pop: float) -> float:
+    """Expected visitors at (temp, pop) for a month (1-12) and weekday (Monday=0), bilinearly interpolated."""
+    plane = surface.values[month - 1, weekday]
+    i, t = _grid_position(TEMP_GRID, temp)
+    j, p = _grid_position(POP_GRID, pop)
+    return float(
+        (1 - t) * ((1 - p) * plane[i, j] + p * plane[i, j + 1])
+        + t * ((1 - p) * plane[i + 1, j] + p * plane[i + 1, j + 1])
+    )
+
+
+def surface_slice(surface: SensitivitySurface, month: int, weekday: int) -> Dict[str, Any]:
+    """The temperature x pop plane for one month and weekday, for charting."""
+    return {
+        "site_id": surface.site_id,
+        "month": month,
+        "weekday": weekday,
+        "temps": TEMP_GRID.tolist(),
+        "pops": POP_GRID.tolist(),
+        "values": np.round(surface.values[month - 1, weekday], 1).tolist(),
+        "computed_at": surface.computed_at,
+    }
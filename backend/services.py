@@ -3,7 +3,8 @@ import requests
 from dotenv import load_dotenv
 from datetime import datetime
 import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from backend.models_db import VisitorDataDb
@@ -14,27 +15,42 @@ load_dotenv()
 
 # OpenWeather API config
 OPENWEATHER_API_KEY = settings.OPENWEATHER_API_KEY
-OPENWEATHER_BASE_URL = "https://api.openweathermap.org/data/2.5"
+OPENWEATHER_BASE_URL = settings.OPENWEATHER_BASE_URL
 
 # Simple in-memory cache
 weather_cache: Dict[str, Dict[str, Any]] = {}
-CACHE_DURATION_SECONDS = 10 * 60  # 10 minutes
+CACHE_DURATION_SECONDS = settings.WEATHER_CACHE_SECONDS
 
 
-def get_historical_visitor_data(db: Session, limit: int = 1000) -> pd.DataFrame:
+def get_historical_visitor_data(
+    db: Session,
+    limit: Optional[int] = 1000,
+    columns: Optional[List[str]] = None,
+    site_id: Optional[str] = None
+) -> pd.DataFrame:
     """
-    Fetches historical visitor data from the database.
+    Fetches historical visitor data, newest first, optionally restricted to one site.
+    Pass limit=None to load the full history, and `columns` to read only the columns needed
+    (e.g. the model inputs) instead of whole rows.
     """
+    if settings.use_columnar_store:
+        from backend import columnar_store
+        return columnar_store.load_visitor_frame(columns=columns, limit=limit, site_id=site_id)
+
     try:
-        query_result = db.query(VisitorDataDb).order_by(VisitorDataDb.date.desc()).limit(limit).all()
-        if not query_result:
+        table_columns = VisitorDataDb.__table__.columns
+        selected = [table_columns[name] for name in columns] if columns else list(table_columns)
+
+        stmt = select(*selected).order_by(VisitorDataDb.date.desc())
+        if site_id is not None:
+            stmt = stmt.where(VisitorDataDb.site_id == site_id)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        rows = db.execute(stmt).all()
+        if not rows:
             return pd.DataFrame()
 
-        data_list = [
-            {column.name: getattr(row, column.name) for column in row.__table__.columns}
-            for row in query_result
-        ]
-        df = pd.DataFrame(data_list)
+        df = pd.DataFrame(rows, columns=[column.name for column in selected])
 
         if 'date' in df.columns:
             df['date'] = pd.to_datetime(df['date'])